@@ -1,48 +1,66 @@
+from functools import partial
+
 import numpy as np
-import pandas as pd
-from FinancesTools.FinancesObjects import FinanceObject, Utility, SpecifiedColumn, ColumnObject, ZeroColumn
+from FinancesTools.Calendar import Calendar
+from FinancesTools.FinancesObjects import FinanceObject, Utility, SpecifiedColumn, NO_DELTA
 from FinancesTools.Loans import OneTimePayment
-from FinancesTools.Income import IncomeColumn
+from FinancesTools.Schedules import get_schedule
 
 
 class OneTimeCost(OneTimePayment):
     # hits cash (default)
+    __slots__ = ()
+
     def __init__(self, name, timestamp, amount):
         super(OneTimeCost, self).__init__(name, timestamp, -1*amount)
 
 
 class OneTimeAsset(OneTimePayment):
+    __slots__ = ()
+
     def __init__(self, name, timestamp, amount):
         super(OneTimeAsset, self).__init__(name, timestamp, amount)
 
     def get_assets_delta(self):
-        return self.get_column_df()
+        return self.get_sparse_delta()
 
     def get_net_cash_delta(self):
-        return ZeroColumn(self.name, self.start_timestamp, self.end_timestamp).get_column_df()
+        return NO_DELTA
 
 
 class AppreciationSchedule(SpecifiedColumn):
     # base class for an appreciation schedule, can have compound interest, manual schedyle etc.
-    def __init__(self, name, start_timestamp, end_timestamp, column):
-        super(AppreciationSchedule, self).__init__(name, start_timestamp, end_timestamp, column)
+    __slots__ = ()
+
+    def __init__(self, name, start_timestamp, end_timestamp, column, inputs=()):
+        super(AppreciationSchedule, self).__init__(name, start_timestamp, end_timestamp, column, inputs)
 
     # hits assets col
     def get_assets_delta(self):
-        return self.get_column_df()
+        return self.get_dense_delta()
 
 
 class IncomeSchedule(SpecifiedColumn):
-    def __init__(self, name, start_timestamp, end_timestamp, column):
-        super(IncomeSchedule, self).__init__(name, start_timestamp, end_timestamp, column)
+    __slots__ = ()
+
+    def __init__(self, name, start_timestamp, end_timestamp, column, inputs=()):
+        super(IncomeSchedule, self).__init__(name, start_timestamp, end_timestamp, column, inputs)
 
     # income hits cash
     def get_net_cash_delta(self):
-        return self.get_column_df()
+        return self.get_dense_delta()
 
 
 class CashFlowAsset(FinanceObject):
-    def __init__(self, name, start_timestamp, end_timestamp, asset_cost, appreciation_type, appreciation_args, income_type, income_args):
+    """
+    Asset bought at start_timestamp that appreciates and pays income until end_timestamp, or until it is sold
+    by an event such as {"timestamp": 203001, "type": "sale", "price": 900000, "costs": 30000}, see sell. A
+    sale event with "payoff": "<loan name>" also pays that loan off in the sale month, builder_pipeline adds the
+    payoff event to the loan.
+    """
+    event_types = ("sale",)
+
+    def __init__(self, name, start_timestamp, end_timestamp, asset_cost, appreciation_type, appreciation_args, income_type, income_args, events=None):
         super(CashFlowAsset, self).__init__()
         self.name = name
         self.end_passed = end_timestamp
@@ -50,6 +68,9 @@ class CashFlowAsset(FinanceObject):
         self.start = Utility.add_months_to_timestamp(start_timestamp, 1)
         self.end = Utility.add_months_to_timestamp(end_timestamp, 1)
         self.asset_cost = asset_cost
+        self.appreciation_model = None
+        self.income_type = income_type
+        self.income_args = income_args
         self.appreciation = self.get_appreciation_schedule(appreciation_type, appreciation_args)
         self.income = self.get_income_schedule(income_type, income_args)
 
@@ -63,11 +84,53 @@ class CashFlowAsset(FinanceObject):
         # asset cash flow in
         self.add_column_object(self.income)
 
+        self.sale_timestamp = None
+        self.sale_value = None
+        self.sold_at_market = False
+        for event in events or ():
+            self.add_event(event)
+
+    def add_event(self, event):
+        if event["type"] not in CashFlowAsset.event_types:
+            raise ValueError(f"unknown asset event {event['type']}, expected one of {CashFlowAsset.event_types}")
+        self.sell(event["timestamp"], event.get("price"), event.get("costs", 0))
+        return self
+
+    def sell(self, timestamp, price=None, costs=0):
+        """
+        Sell at the end of month timestamp: the appreciation and income schedules are cut at that month, the
+        proceeds (price, by default the asset's value that month, less costs) go to cash and the asset's value
+        leaves assets. A builder picks the change up with replace_finance_object(asset, asset).
+        """
+        if self.sale_timestamp is not None:
+            raise ValueError(f"{self.name} is already sold at {self.sale_timestamp}")
+        Calendar.check(timestamp)
+        if not self.start <= timestamp <= self.end:
+            raise ValueError(f"{self.name} can only be sold from {self.start} to {self.end}, not at {timestamp}")
+        sale = Calendar.to_ordinal(timestamp)
+        held = sale - self.appreciation.start_ordinal + 1
+        self.sale_value = self.asset_cost + float(np.nansum(self.appreciation.column[:held]))
+
+        # only the tail after the sale changes: the schedules end there
+        for col in (self.appreciation, self.income):
+            col.end_ordinal = sale
+            if not callable(col.source) and np.ndim(col.source) > 0:
+                col.source = np.asarray(col.source)[:col.n_months]
+            col.invalidate()
+
+        self.sale_timestamp = timestamp
+        self.sold_at_market = price is None
+        price = self.sale_value if price is None else price
+        self.add_column_object(OneTimePayment(f"{self.name} Sale Proceeds", timestamp, price - costs))
+        self.add_column_object(OneTimeAsset(f"{self.name} Disposal", timestamp, -self.sale_value))
+
     def get_appreciation_schedule(self, appreciation_type, appreciation_args):
         if appreciation_type == "constant":
             return self.generate_constant_appreciation_schedule(**appreciation_args)
         elif appreciation_type == "specified":
             return self.generate_specified_appreciation_schedule(**appreciation_args)
+        elif appreciation_type == "stochastic":
+            return self.generate_stochastic_appreciation_schedule(**appreciation_args)
 
     def get_income_schedule(self, income_type, income_args):
         if income_type == "constant":
@@ -76,30 +139,77 @@ class CashFlowAsset(FinanceObject):
             return self.generate_proportional_income_schedule(**income_args)
 
     def generate_constant_appreciation_schedule(self, appreciation_amount):
-        schedule = [appreciation_amount for i in range(len(ColumnObject.build_index(self.start, self.end)))]
-        return AppreciationSchedule(f"{self.name} appreciation", self.start, self.end, schedule)
-
-    def generate_specified_appreciation_schedule(self, csv_loc):
-        schedule_df = pd.read_csv(csv_loc)
-        assert min(schedule_df['timestamp']) == self.zero_day
-        assert max(schedule_df['timestamp']) == self.end
-        apprectiation_monthly = []
-        for pct in schedule_df['pct'].shift(periods=1):
-            monthly_pct = pct/12
-            if not apprectiation_monthly:
-                apprectiation_monthly.append(self.asset_cost)
-            else:
-                apprectiation_monthly.append(apprectiation_monthly[-1]*(1+monthly_pct))
-        cu_appreciation = (pd.Series(apprectiation_monthly) - self.asset_cost).diff()
+        # one value for every month, only materialized if something asks for the array
+        return AppreciationSchedule(f"{self.name} appreciation", self.start, self.end, appreciation_amount)
+
+    @staticmethod
+    def compound_appreciation(asset_cost, growth):
+        """
+        Monthly appreciation deltas from month over month growth factors, growth is (..., n_months - 1) so a
+        batch of paths (or of assets, with one asset_cost each) compounds in one pass. The first month has no
+        appreciation (nan like the csv schedules)
+        """
+        growth = np.asarray(growth, dtype=float)
+        asset_cost = np.asarray(asset_cost, dtype=float)[..., None]
+        asset_value = np.empty(growth.shape[:-1] + (growth.shape[-1] + 1,))
+        asset_value[..., :1] = asset_cost
+        asset_value[..., 1:] = growth
+        np.cumprod(asset_value, axis=-1, out=asset_value)
+        appreciation = np.empty_like(asset_value)
+        appreciation[..., 0] = np.nan
+        appreciation[..., 1:] = np.diff(asset_value - asset_cost, axis=-1)
+        return appreciation
+
+    @staticmethod
+    def proportional_income(asset_cost, appreciation, proportion):
+        asset_value = asset_cost + np.cumsum(np.nan_to_num(appreciation), axis=-1)
+        return asset_value * proportion
+
+    def generate_specified_appreciation_schedule(self, csv_loc, cu_appreciation=None):
+        schedule = get_schedule(csv_loc)
+        assert schedule.start_timestamp == self.zero_day
+        assert schedule.end_timestamp == self.end
+        # bulk loads compound every asset on the same schedule at once and hand in their row
+        if cu_appreciation is None:
+            cu_appreciation = self.compound_appreciation(self.asset_cost, 1 + schedule['pct'][:-1] / 12)
+        return AppreciationSchedule(f"{self.name} appreciation", self.zero_day, self.end, cu_appreciation)
+
+    def generate_stochastic_appreciation_schedule(self, model, **model_args):
+        # deterministic runs follow the expected path, ScenarioEngine samples the rest
+        from FinancesTools.Scenarios import get_appreciation_model
+        self.appreciation_model = get_appreciation_model(model, **model_args)
+        growth = self.appreciation_model.expected_growth(Calendar.n_months(self.zero_day, self.end) - 1)
+        cu_appreciation = self.compound_appreciation(self.asset_cost, growth)
         return AppreciationSchedule(f"{self.name} appreciation", self.zero_day, self.end, cu_appreciation)
 
+    def generate_scenario_paths(self, n_paths, rng):
+        """
+        (n_paths, n_months) appreciation and, when the income depends on it, income paths, and for an asset sold
+        at market the (n_paths,) proceeds on top of the expected path's
+        """
+        growth = self.appreciation_model.sample_growth(n_paths, Calendar.n_months(self.zero_day, self.end) - 1, rng)
+        appreciation = self.compound_appreciation(self.asset_cost, growth)
+        appreciation[:, 0] = 0
+        # a sold asset stops at the sale
+        appreciation = appreciation[:, :self.appreciation.n_months]
+        income = None
+        if self.income_type == "proportional":
+            income = self.proportional_income(self.asset_cost, appreciation, **self.income_args)
+        proceeds = None
+        if self.sale_timestamp is not None:
+            # the disposal takes each path's own value out of assets
+            gain = self.asset_cost + appreciation.sum(axis=1) - self.sale_value
+            appreciation[:, -1] -= gain
+            if self.sold_at_market:
+                proceeds = gain
+        return appreciation, income, proceeds
+
     def generate_constant_income_schedule(self, income_amount):
-        schedule = [income_amount for i in range(len(ColumnObject.build_index(self.start, self.end)))]
-        return IncomeSchedule(f"{self.name} income", self.start, self.end, schedule)
+        # one value for every month, only materialized if something asks for the array
+        return IncomeSchedule(f"{self.name} income", self.start, self.end, income_amount)
 
     def generate_proportional_income_schedule(self, proportion):
-        asset_value = [self.asset_cost + x for x in self.appreciation.column.fillna(0).cumsum().fillna(0)]
-        print(self.appreciation.column)
-        print(asset_value)
-        schedule = [i*proportion for i in asset_value]
-        return IncomeSchedule(f"{self.name} income", self.zero_day, self.end, schedule)
+        # computed from the appreciation schedule on first use and again whenever that schedule changes
+        schedule = partial(CashFlowAsset.proportional_income, self.asset_cost, proportion=proportion)
+        # follows the appreciation schedule, which starts at zero_day (specified) or the month after (constant)
+        return IncomeSchedule(f"{self.name} income", self.appreciation.start_timestamp, self.end, schedule, inputs=[self.appreciation])
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+from FinancesTools.Calendar import Calendar
+from FinancesTools.Assets import CashFlowAsset
+from FinancesTools.Income import SimpleIncomeStream, SpecifiedIncomeStream
+from FinancesTools.Loans import Loan
+from FinancesTools.Schedules import get_schedule
+
+# one row per object, the columns mirror the json config keys with the *_args flattened:
+# loans:   name, start_timestamp, end_timestamp, loan_amount, rate
+# assets:  name, start_timestamp, end_timestamp, asset_cost, appreciation_type, appreciation_amount | csv_loc,
+#          income_type, income_amount | proportion
+# incomes: name, start_timestamp, end_timestamp, income_amount, or name, csv_path[, percentage]
+
+
+def read_table(table):
+    """
+    A DataFrame as is, or a .parquet / .csv path
+    """
+    if isinstance(table, pd.DataFrame):
+        return table
+    if table.endswith(".parquet"):
+        return pd.read_parquet(table)
+    return pd.read_csv(table)
+
+
+def present(value):
+    return value is not None and not (isinstance(value, float) and np.isnan(value))
+
+
+def load_loans(builder, table):
+    """
+    Every loan's payment and amortization schedule comes from one batched closed form evaluation
+    """
+    table = read_table(table)
+    zero_day = table["start_timestamp"].to_numpy(dtype=np.int64)
+    start = Calendar.add_months(zero_day, 1)
+    end = Calendar.add_months(table["end_timestamp"].to_numpy(dtype=np.int64), 1)
+    n_months = np.maximum(Calendar.to_ordinal(end) - Calendar.to_ordinal(start) + 1, 0)
+    amount = table["loan_amount"].to_numpy()
+    rate = table["rate"].to_numpy()
+    with builder.profiler.stage("load_loans.amortization"):
+        payments = Loan.payment(amount, rate, n_months)
+        interest, principal = Loan.amortization_schedule(amount, rate, n_months)
+
+    with builder.profiler.stage("load_loans.objects"):
+        loans = [
+            Loan(name, start_timestamp, end_timestamp, loan_amount, loan_rate, payment_per_month=payment, schedule=(interest[i, :n], principal[i, :n]))
+            for i, (name, start_timestamp, end_timestamp, loan_amount, loan_rate, payment, n) in enumerate(zip(
+                table["name"].tolist(), table["start_timestamp"].tolist(), table["end_timestamp"].tolist(),
+                amount.tolist(), rate.tolist(), payments, n_months.tolist()))
+        ]
+    builder.add_finance_objects(loans)
+    return loans
+
+
+def load_assets(builder, table):
+    """
+    Assets appreciating on the same csv schedule are compounded together as one (n_assets, n_months) batch
+    """
+    table = read_table(table)
+    rows = table.to_dict("records")
+    cu_appreciation = {}
+    with builder.profiler.stage("load_assets.appreciation"):
+        specified = table[table["appreciation_type"] == "specified"]
+        for csv_loc, group in specified.groupby("csv_loc", sort=False):
+            schedule = get_schedule(csv_loc)
+            growth = 1 + schedule['pct'][:-1] / 12
+            batch = CashFlowAsset.compound_appreciation(group["asset_cost"].to_numpy(), np.broadcast_to(growth, (len(group), len(growth))))
+            for i, index in enumerate(group.index):
+                cu_appreciation[index] = batch[i]
+
+    with builder.profiler.stage("load_assets.objects"):
+        assets = []
+        for index, row in zip(table.index, rows):
+            if row["appreciation_type"] == "constant":
+                appreciation_args = {"appreciation_amount": row["appreciation_amount"]}
+            elif row["appreciation_type"] == "specified":
+                appreciation_args = {"csv_loc": row["csv_loc"], "cu_appreciation": cu_appreciation[index]}
+            else:
+                raise ValueError(f"appreciation type {row['appreciation_type']} can not be bulk loaded")
+            if row["income_type"] == "constant":
+                income_args = {"income_amount": row["income_amount"]}
+            else:
+                income_args = {"proportion": row["proportion"]}
+            assets.append(CashFlowAsset(row["name"], int(row["start_timestamp"]), int(row["end_timestamp"]), row["asset_cost"],
+                                        row["appreciation_type"], appreciation_args, row["income_type"], income_args))
+    builder.add_finance_objects(assets)
+    return assets
+
+
+def load_incomes(builder, table):
+    table = read_table(table)
+    incomes = []
+    with builder.profiler.stage("load_incomes.objects"):
+        for row in table.to_dict("records"):
+            if present(row.get("csv_path")):
+                kwargs = {"percentage": row["percentage"]} if present(row.get("percentage")) else {}
+                incomes.append(SpecifiedIncomeStream(row["name"], row["csv_path"], **kwargs))
+            else:
+                incomes.append(SimpleIncomeStream(row["name"], int(row["start_timestamp"]), int(row["end_timestamp"]), row["income_amount"]))
+    builder.add_finance_objects(incomes)
+    return incomes
+
+
+loaders = {"loans": load_loans, "assets": load_assets, "incomes": load_incomes}
+
+
+def load_tables(builder, tables):
+    """
+    tables maps "loans" / "assets" / "incomes" to a table (path or DataFrame) of those objects
+    """
+    for kind, table in tables.items():
+        loaders[kind](builder, table)
+    return builder
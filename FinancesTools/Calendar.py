@@ -0,0 +1,64 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=4096)
+def _month_range(start_ordinal, end_ordinal):
+    stamps = Calendar.from_ordinal(np.arange(start_ordinal, end_ordinal + 1, dtype=np.int64))
+    stamps.setflags(write=False)
+    return stamps
+
+
+class Calendar:
+    """
+    YYYYMM timestamps <-> absolute month ordinals (year * 12 + month - 1), vectorized over numpy arrays.
+    Index arrays that were already built are cached and handed out read only.
+    """
+
+    @staticmethod
+    def _scalar(value):
+        return int(value) if np.ndim(value) == 0 else value
+
+    @staticmethod
+    def to_ordinal(timestamps):
+        # plain ints skip numpy, every column object converts its bounds this way
+        if isinstance(timestamps, (int, np.integer)):
+            return (int(timestamps) // 100) * 12 + int(timestamps) % 100 - 1
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        return Calendar._scalar((timestamps // 100) * 12 + timestamps % 100 - 1)
+
+    @staticmethod
+    def from_ordinal(ordinals):
+        if isinstance(ordinals, (int, np.integer)):
+            return (int(ordinals) // 12) * 100 + int(ordinals) % 12 + 1
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        return Calendar._scalar((ordinals // 12) * 100 + ordinals % 12 + 1)
+
+    @staticmethod
+    def check(timestamps):
+        if isinstance(timestamps, (int, np.integer)):
+            assert 1 <= int(timestamps) % 100 <= 12
+            return
+        month = np.asarray(timestamps) % 100
+        assert ((month >= 1) & (month <= 12)).all()
+
+    @staticmethod
+    def n_months(start_timestamp, end_timestamp):
+        return max(Calendar.to_ordinal(end_timestamp) - Calendar.to_ordinal(start_timestamp) + 1, 0)
+
+    @staticmethod
+    def month_range(start_timestamp, end_timestamp):
+        Calendar.check(start_timestamp)
+        Calendar.check(end_timestamp)
+        return _month_range(Calendar.to_ordinal(start_timestamp), Calendar.to_ordinal(end_timestamp))
+
+    @staticmethod
+    def add_months(timestamps, months):
+        if isinstance(timestamps, (int, np.integer)) and isinstance(months, (int, np.integer)):
+            return Calendar.from_ordinal(Calendar.to_ordinal(timestamps) + int(months))
+        return Calendar.from_ordinal(Calendar.to_ordinal(timestamps) + np.asarray(months, dtype=np.int64))
+
+    @staticmethod
+    def offsets(timestamps, start_timestamp):
+        return Calendar.to_ordinal(timestamps) - Calendar.to_ordinal(start_timestamp)
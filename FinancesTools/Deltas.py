@@ -0,0 +1,66 @@
+import numpy as np
+
+from FinancesTools.Calendar import Calendar
+
+
+class NoDelta:
+    """
+    Shared "no contribution" result for get_net_cash_delta / get_assets_delta / get_liabilities_delta.
+    The builder skips it instead of merging an all zero frame.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(NoDelta, cls).__new__(cls)
+        return cls._instance
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "NO_DELTA"
+
+
+NO_DELTA = NoDelta()
+
+
+class SparseDelta:
+    """
+    Delta that only touches a few months, kept as timestamp / value pairs instead of a full frame.
+    """
+    def __init__(self, timestamps, values):
+        self.timestamps = np.atleast_1d(np.asarray(timestamps, dtype=np.int64))
+        self.values = np.atleast_1d(np.asarray(values))
+
+    def get_column_df(self, name="delta"):
+        import pandas as pd
+        return pd.DataFrame({"timestamp": self.timestamps, name: self.values})
+
+    def __repr__(self):
+        return f"SparseDelta({dict(zip(self.timestamps.tolist(), self.values.tolist()))})"
+
+
+class DenseDelta:
+    """
+    Delta over consecutive months, kept as its first month plus one value per month (or a single value for
+    every month) instead of a frame.
+    """
+    __slots__ = ("start_timestamp", "values", "n_months")
+
+    def __init__(self, start_timestamp, values, n_months=None):
+        self.start_timestamp = start_timestamp
+        self.values = values
+        self.n_months = len(values) if n_months is None else n_months
+
+    def get_column_df(self, name="delta"):
+        import pandas as pd
+        timestamps = Calendar.month_range(self.start_timestamp, Calendar.add_months(self.start_timestamp, self.n_months - 1))
+        return pd.DataFrame({"timestamp": timestamps, name: np.broadcast_to(self.values, self.n_months).copy()})
+
+    def __repr__(self):
+        return f"DenseDelta({self.start_timestamp}, {self.n_months} months)"
+
+
+def is_no_delta(delta):
+    return delta is None or delta is NO_DELTA
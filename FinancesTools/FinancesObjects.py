@@ -1,42 +1,95 @@
-import pandas as pd
+import mmap
+import multiprocessing
+import os
+
+import numpy as np
+from FinancesTools.Calendar import Calendar
+from FinancesTools.Deltas import NO_DELTA, DenseDelta, is_no_delta
+from FinancesTools.Instrumentation import NULL_PROFILER
+from FinancesTools.Ledger import Ledger
+from FinancesTools.Sinks import get_sink
+
+# (builder, objects, column counts, ledger, partials) of a parallel build_ledger, forked workers inherit it
+_forked = None
+
+
+def _write_block(block):
+    builder, objects, counts, ledger, partials = _forked
+    meta, records = builder.write_block(ledger, partials, objects, counts, *block)
+    return meta, Ledger.pack_records(records)
+
+
+def shared_zeros(shape):
+    # anonymous shared mapping, what forked workers write into it the parent sees
+    size = int(np.prod(shape))
+    return np.frombuffer(mmap.mmap(-1, max(size, 1) * 8), dtype=np.float64, count=size).reshape(shape)
 
 
 class ColumnObject:
+    """
+    A lazy node: values are computed on first use and memoized until invalidate() is called on the column or
+    on one of the columns it depends on. Only the start / end month ordinals and the values are kept, constant
+    columns hand the ledger their scalar and never materialize an array, and a DataFrame is only built when
+    get_column_df is called.
+    """
+    __slots__ = ("name", "start_ordinal", "end_ordinal", "values", "inputs", "dependents")
+
     def __init__(self, name, start_timestamp, end_timestamp):
         self.name = name
-        self.start_timestamp = start_timestamp
-        self.end_timestamp = end_timestamp
-        self.column_df = None
+        # to_ordinal would quietly roll a month 13 over into the next year
+        Calendar.check(start_timestamp)
+        Calendar.check(end_timestamp)
+        self.start_ordinal = Calendar.to_ordinal(start_timestamp)
+        self.end_ordinal = Calendar.to_ordinal(end_timestamp)
+        self.values = None
+        self.inputs = ()
+        self.dependents = ()
+
+    @property
+    def start_timestamp(self):
+        return Calendar.from_ordinal(self.start_ordinal)
+
+    @property
+    def end_timestamp(self):
+        return Calendar.from_ordinal(self.end_ordinal)
+
+    @property
+    def n_months(self):
+        return max(self.end_ordinal - self.start_ordinal + 1, 0)
 
     @staticmethod
     def timestamp_check(timestamp):
-        month = timestamp % 100
-        assert ((month >= 1) and (month <= 12))
+        Calendar.check(timestamp)
 
     @staticmethod
     def build_index(start_time, end_time):
-        ColumnObject.timestamp_check(start_time)
-        ColumnObject.timestamp_check(end_time)
-        stamps = []
-        current_stamp = start_time
-        while current_stamp <= end_time:
-            stamps.append(current_stamp)
-            if current_stamp % 100 == 12:
-                current_stamp = current_stamp + 89
-            else:
-                current_stamp += 1
-        return pd.DataFrame({"timestamp": stamps})
+        import pandas as pd
+        return pd.DataFrame({"timestamp": Calendar.month_range(start_time, end_time)})
+
+    def depends_on(self, *columns):
+        for col in columns:
+            self.inputs += (col,)
+            col.dependents += (self,)
+
+    def invalidate(self):
+        self.values = None
+        for col in self.dependents:
+            col.invalidate()
 
     def add_to_col(self, df):
         """
         Merge dataframes and return just the dataframe with the original column
         """
+        if is_no_delta(df):
+            return
+        if hasattr(df, "get_column_df"):
+            df = df.get_column_df()
         new_col_name = df.columns.to_list()
         new_col_name.remove("timestamp")
         new_col_name = new_col_name[0]
         temp_df = self.get_column_df().merge(df, how="left", on="timestamp").fillna(0)
-        temp_df[self.name] = temp_df[self.name] + temp_df[new_col_name]
-        self.column_df = temp_df[["timestamp", self.name]]
+        self.invalidate()
+        self.values = (temp_df[self.name] + temp_df[new_col_name]).to_numpy()
 
     def get_net_cash_delta(self):
         raise NotImplemented("implement add to net cash behavior!")
@@ -47,54 +100,100 @@ class ColumnObject:
     def get_liabilities_delta(self):
         raise NotImplemented("implement add to liabilities behavior!")
 
-    def get_column_df(self):
-        raise NotImplemented("get column behavior must be implemented")
+    def compute_values(self):
+        raise NotImplementedError("compute values behavior must be implemented")
+
+    def get_constant(self):
+        # the value of every month for constant columns, None otherwise
+        return None
 
+    def get_column_values(self):
+        # one value per month from start_timestamp to end_timestamp, shared so callers must not mutate it
+        if self.values is None:
+            self.values = self.compute_values()
+        return self.values
 
-class SpecifiedColumn(ColumnObject):
-    def __init__(self, name, start_timestamp, end_timestamp, column):
-        super(SpecifiedColumn, self).__init__(name, start_timestamp, end_timestamp)
-        self.column = column
+    def get_compact_values(self):
+        """
+        What the ledger needs: the scalar of a constant column that was never materialized, else the values
+        """
+        if self.values is None:
+            constant = self.get_constant()
+            if constant is not None:
+                return constant
+        return self.get_column_values()
+
+    def get_dense_delta(self):
+        return DenseDelta(self.start_timestamp, self.get_compact_values(), self.n_months)
 
     def get_column_df(self):
+        # built on request only, nothing frame shaped is kept on the column
         df = self.build_index(self.start_timestamp, self.end_timestamp)
-        df[self.name] = self.column
+        df[self.name] = np.array(self.get_column_values())
         return df
 
+
+class SpecifiedColumn(ColumnObject):
+    __slots__ = ("source",)
+
+    def __init__(self, name, start_timestamp, end_timestamp, column, inputs=()):
+        super(SpecifiedColumn, self).__init__(name, start_timestamp, end_timestamp)
+        # values, a scalar for every month, or a function of the inputs' values that is evaluated on first use
+        self.source = column
+        self.depends_on(*inputs)
+
+    @property
+    def column(self):
+        return self.get_column_values()
+
+    @column.setter
+    def column(self, column):
+        self.source = column
+        self.invalidate()
+
+    def get_constant(self):
+        if not callable(self.source) and np.ndim(self.source) == 0:
+            return self.source
+        return None
+
+    def compute_values(self):
+        if callable(self.source):
+            return np.asarray(self.source(*[col.get_column_values() for col in self.inputs]))
+        if np.ndim(self.source) == 0:
+            return np.full(self.n_months, self.source)
+        return np.asarray(self.source)
+
     def get_net_cash_delta(self):
-        return ZeroColumn(self.name, self.start_timestamp, self.end_timestamp).get_column_df()
+        return NO_DELTA
 
     def get_assets_delta(self):
-        return ZeroColumn(self.name, self.start_timestamp, self.end_timestamp).get_column_df()
+        return NO_DELTA
 
     def get_liabilities_delta(self):
-        return ZeroColumn(self.name, self.start_timestamp, self.end_timestamp).get_column_df()
+        return NO_DELTA
 
 
 
 class ZeroColumn(ColumnObject):
+    __slots__ = ()
+
     def __init__(self, name, start_timestamp, end_timestamp):
         super(ZeroColumn, self).__init__(name, start_timestamp, end_timestamp)
 
     def get_net_cash_delta(self):
-        return None
+        return NO_DELTA
 
     def get_assets_delta(self):
-        return None
+        return NO_DELTA
 
     def get_liabilities_delta(self):
-        return None
-
-    def get_column_df(self):
+        return NO_DELTA
 
-        if self.column_df is None:
-            df = self.build_index(self.start_timestamp, self.end_timestamp)
-            df[self.name] = 0
-            self.column_df = df
-        else:
-            df = self.column_df
+    def get_constant(self):
+        return 0
 
-        return df
+    def compute_values(self):
+        return np.zeros(self.n_months, dtype=np.int64)
 
 
 class FinanceObject:
@@ -109,16 +208,39 @@ class FinanceObject:
 
 
 class FinancesBuilder:
-    def __init__(self):
+    # accumulators behind the totals, by index into the ledger's net cash / assets / liabilities
+    accumulator_outputs = {
+        "net_cash": (0,), "Cash Balance": (0,),
+        "net assets": (1,), "Assets": (1,),
+        "net liabilities": (2,), "Liabilities": (2,),
+        "NW": (0, 1, 2),
+    }
+    delta_getters = ("get_net_cash_delta", "get_assets_delta", "get_liabilities_delta")
+    # ledgers are filled in blocks of objects with about this many columns, see fill_ledger
+    block_columns = 512
+
+    def __init__(self, profiler=None, workers=None):
+        # opt-in instrumentation, see FinancesTools.Instrumentation
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        # processes that fill the ledger blocks of build_ledger
+        self.workers = workers or 1
         self.net_cash = None
         self.assets = None
         self.liabilities = None
         self.master_df = None
+        self.ledger = None
         self.objects = []
+        # transforms between column generation and delta accumulation (e.g. FinancesTools.Taxes.TaxStage) and
+        # the finance objects they derived from self.objects, written to the ledger after them
+        self.stages = []
+        self.derived = []
+        # per object delta records and column counts of the current ledger, parallel to self.objects + self.derived
+        self.records = []
+        self.column_counts = []
         self.min_timestamp = 999999
         self.max_timestamp = 000000
 
-    def add_finance_object(self, obj):
+    def extend_bounds(self, obj):
         for col in obj:
             if col.start_timestamp < self.min_timestamp:
                 self.min_timestamp = col.start_timestamp
@@ -126,70 +248,369 @@ class FinancesBuilder:
             if col.end_timestamp > self.max_timestamp:
                 self.max_timestamp = col.end_timestamp
 
+    def update_bounds(self):
+        self.min_timestamp = 999999
+        self.max_timestamp = 000000
+        for obj in self.objects:
+            self.extend_bounds(obj)
+
+    def add_finance_object(self, obj):
+        self.extend_bounds(obj)
         self.objects.append(obj)
 
+    def add_finance_objects(self, objs):
+        """
+        Add many objects at once, bounds are taken over all their columns in one pass
+        """
+        objs = list(objs)
+        columns = [col for obj in objs for col in obj]
+        if columns:
+            self.min_timestamp = min(self.min_timestamp, Calendar.from_ordinal(min(col.start_ordinal for col in columns)))
+            self.max_timestamp = max(self.max_timestamp, Calendar.from_ordinal(max(col.end_ordinal for col in columns)))
+        self.objects.extend(objs)
+
+    def add_stage(self, stage):
+        self.stages.append(stage)
+
+    def staged_objects(self):
+        """
+        Run the stages over the generated columns, returns the objects plus the ones the stages derived
+        """
+        self.derived = []
+        for stage in self.stages:
+            with self.profiler.stage("apply", stage):
+                self.derived.extend(stage.apply(self.objects + self.derived))
+        return self.objects + self.derived
+
     def merge_to_master(self, col):
         self.master_df.merge(col.get_column_df, how="left", on="timestamp")
 
-    def generate_master_df(self):
-        self.net_cash = ZeroColumn("net_cash", self.min_timestamp, self.max_timestamp)
-        self.assets = ZeroColumn("net assets", self.min_timestamp, self.max_timestamp)
-        self.liabilities = ZeroColumn("net liabilities", self.min_timestamp, self.max_timestamp)
-        self.master_df = ColumnObject.build_index(self.min_timestamp, self.max_timestamp)
-        print(f"Master DF: \n{self.master_df}")
+    def write_column(self, ledger, j, col):
+        """
+        Write one column into ledger column j and apply its deltas, returns the delta records
+        """
+        stage = self.profiler.stage
+        with stage("get_column_values", col):
+            values = col.get_compact_values()
+        with stage("get_net_cash_delta", col):
+            net_cash = col.get_net_cash_delta()
+        with stage("get_assets_delta", col):
+            assets = col.get_assets_delta()
+        with stage("get_liabilities_delta", col):
+            liabilities = col.get_liabilities_delta()
+        with stage("merge"):
+            ledger.write_values(j, col.name, col.start_timestamp, values, col.n_months)
+            span = (col.start_timestamp, col.end_timestamp)
+            return [
+                ledger.add_net_cash_delta(net_cash, span),
+                ledger.add_assets_delta(assets, span),
+                ledger.add_liabilities_delta(liabilities, span),
+            ]
+
+    def write_object(self, ledger, obj, j):
+        """
+        Write an object's columns into ledger from column j on and apply its deltas, returns its delta records
+        """
+        records = []
+        last = ledger.start_ordinal + ledger.n_months - 1
+        for col in obj:
+            if col.end_ordinal < ledger.start_ordinal or col.start_ordinal > last:
+                # no months in this window of a streamed ledger
+                ledger.skip_column(j, col.name)
+            else:
+                records.extend(self.write_column(ledger, j, col))
+            j += 1
+        return records
 
-        for obj in self.objects:
-            for col in obj:
-                print(col)
-                self.master_df = self.master_df.merge(col.get_column_df(), how="left", on="timestamp").fillna(0)
-                self.net_cash.add_to_col(col.get_net_cash_delta())
-                self.assets.add_to_col(col.get_assets_delta())
-                self.liabilities.add_to_col(col.get_liabilities_delta())
-
-        # print(self.net_cash.get_column_df())
-        # print(self.master_df)
-        self.master_df = self.master_df.merge(self.net_cash.get_column_df(), how="left", on="timestamp").fillna(0)
-        self.master_df = self.master_df.merge(self.assets.get_column_df(), how="left", on="timestamp").fillna(0)
-        self.master_df = self.master_df.merge(self.liabilities.get_column_df(), how="left", on="timestamp").fillna(0)
-
-        self.master_df['Cash Balance'] = self.master_df[self.net_cash.name].cumsum()
-        self.master_df['Assets'] = self.master_df[self.assets.name].cumsum()
-        self.master_df['Liabilities'] = self.master_df[self.liabilities.name].cumsum()
-        self.master_df['NW'] = self.master_df['Cash Balance'] + self.master_df['Assets'] + self.master_df['Liabilities']
+    def blocks(self, counts):
+        """
+        (first object, end object, first column) of consecutive runs of objects with about block_columns columns,
+        from their column counts only so every fill of the same objects uses the same blocks
+        """
+        blocks = []
+        lo = j = size = 0
+        for k, n_columns in enumerate(counts):
+            size += n_columns
+            if size >= self.block_columns:
+                blocks.append((lo, k + 1, j))
+                lo, j, size = k + 1, j + size, 0
+        if lo < len(counts) or not blocks:
+            blocks.append((lo, len(counts), j))
+        return blocks
+
+    def write_block(self, ledger, partials, objects, counts, b, lo, hi, j):
+        """
+        Write objects [lo, hi), whose columns start at column j, into a ledger of their own over ledger's months,
+        copy its values into ledger and its delta sums into partials[b]. Returns what ledger.place needs and the
+        delta records, so it can run in a forked worker that shares ledger's matrix and partials.
+        """
+        part = Ledger(ledger.start_timestamp, ledger.end_timestamp, sum(counts[lo:hi]), horizon=ledger.horizon)
+        records = []
+        k = 0
+        for obj, n_columns in zip(objects[lo:hi], counts[lo:hi]):
+            records.append(self.write_object(part, obj, k))
+            k += n_columns
+        ledger.values[:, j:j + k] = part.values
+        partials[b] = part.accumulators()
+        return (part.names, sorted(part.int_columns), part.float_deltas), records
+
+    def fill_ledger(self, ledger, objects, counts, workers=1):
+        """
+        Write objects into ledger block by block, returns their delta records. Each block sums its own deltas and
+        the block sums are combined by Ledger.pairwise_sum, in the same order whether the blocks are written here
+        or by forked worker processes, so the ledger does not depend on the worker count.
+        """
+        blocks = self.blocks(counts)
+        parallel = workers > 1 and len(blocks) > 1 and "fork" in multiprocessing.get_all_start_methods()
+        shape = (len(blocks), ledger.n_months, len(ledger.accumulator_names))
+        partials = shared_zeros(shape) if parallel else np.zeros(shape)
+        if parallel:
+            results = self.fill_parallel(ledger, partials, objects, counts, blocks, workers)
+        else:
+            results = [self.write_block(ledger, partials, objects, counts, b, *block) for b, block in enumerate(blocks)]
+
+        records = []
+        for (_, _, j), (meta, block_records) in zip(blocks, results):
+            ledger.place(j, *meta)
+            records.extend(block_records)
+        with self.profiler.stage("reduce"):
+            ledger.accumulators()[:] = Ledger.pairwise_sum(partials)
+        return records
+
+    def fill_parallel(self, ledger, partials, objects, counts, blocks, workers):
+        global _forked
+        from concurrent.futures import ProcessPoolExecutor
+        # workers write their columns straight into a shared matrix and only send back names and records
+        ledger.bind(shared_zeros(ledger.matrix.shape), ledger.n_columns)
+        _forked = (self, objects, counts, ledger, partials)
+        try:
+            with self.profiler.stage("fill_parallel"):
+                with ProcessPoolExecutor(workers, multiprocessing.get_context("fork")) as pool:
+                    results = list(pool.map(_write_block, [(b,) + block for b, block in enumerate(blocks)]))
+        finally:
+            _forked = None
+        return [(meta, Ledger.unpack_records(packed)) for meta, packed in results]
+
+    def bind_ledger(self):
+        self.net_cash = self.ledger.net_cash
+        self.assets = self.ledger.assets
+        self.liabilities = self.ledger.liabilities
+
+    def build_ledger(self):
+        """
+        The full ledger with running balances and the per object delta records, generate_master_df without the frame
+        """
+        stage = self.profiler.stage
+        objects = self.staged_objects()
+        with stage("allocate"):
+            self.column_counts = [len(list(obj)) for obj in objects]
+            self.ledger = Ledger(self.min_timestamp, self.max_timestamp, sum(self.column_counts))
+
+        self.records = self.fill_ledger(self.ledger, objects, self.column_counts, self.workers)
+        self.bind_ledger()
+        with stage("cumsum"):
+            self.ledger.update_totals()
+        self.master_df = None
+        return self.ledger
 
-        return self.master_df
+    def generate_master_df(self, outputs=None):
+        if outputs is not None:
+            return self.evaluate(outputs)
 
+        with self.profiler.stage("generate_master_df"):
+            self.build_ledger()
+            with self.profiler.stage("frame"):
+                self.master_df = self.ledger.frame()
 
-class Utility:
+        return self.master_df
 
     @staticmethod
-    def add_months_to_timestamp(timestamp, months):
-        month = timestamp % 100
-        year = timestamp // 100
-        added = month + months
-        new_month = added % 12
-        years_passed = added // 12
-        year = year + years_passed
-        return year * 100 + new_month
+    def split_outputs(outputs):
+        """
+        Accumulator indices and column names behind the requested outputs
+        """
+        needed = set()
+        names = set()
+        for output in outputs:
+            if output in FinancesBuilder.accumulator_outputs:
+                needed.update(FinancesBuilder.accumulator_outputs[output])
+            elif output != "timestamp":
+                names.add(output)
+        return sorted(needed), names
+
+    def evaluate_ledger(self, outputs):
+        """
+        Ledger holding only what the requested outputs (totals, accumulators or column names) need, with its
+        running balances up to date. Columns are written only when asked for by name and deltas are only pulled
+        for the accumulators behind the requested totals, so a column that feeds none of them (e.g. loan
+        interest) is never computed. The builder's master_df and ledger are left untouched. Deltas are summed
+        in the blocks build_ledger uses, so the totals are identical to its.
+        """
+        stage = self.profiler.stage
+        needed, names = FinancesBuilder.split_outputs(outputs)
+        objects = self.staged_objects()
+        blocks = self.blocks([len(list(obj)) for obj in objects])
+        ledger = Ledger(self.min_timestamp, self.max_timestamp, sum(col.name in names for obj in objects for col in obj))
+        partials = np.zeros((len(blocks), ledger.n_months, len(ledger.accumulator_names)))
+        j = 0
+        for b, (lo, hi, _) in enumerate(blocks):
+            part = Ledger(self.min_timestamp, self.max_timestamp, 0)
+            for col in [col for obj in objects[lo:hi] for col in obj]:
+                span = (col.start_timestamp, col.end_timestamp)
+                if col.name in names:
+                    with stage("get_column_values", col):
+                        values = col.get_compact_values()
+                    with stage("merge"):
+                        ledger.write_values(j, col.name, col.start_timestamp, values, col.n_months)
+                    j += 1
+                for i in needed:
+                    with stage(FinancesBuilder.delta_getters[i], col):
+                        delta = getattr(col, FinancesBuilder.delta_getters[i])()
+                    with stage("merge"):
+                        part.add_delta(i, delta, span)
+            partials[b] = part.accumulators()
+            ledger.place(j, [], (), part.float_deltas)
+        ledger.accumulators()[:] = Ledger.pairwise_sum(partials)
+
+        with stage("cumsum"):
+            ledger.update_totals()
+        return ledger
+
+    def evaluate(self, outputs):
+        """
+        Frame of timestamp plus only the requested outputs, see evaluate_ledger
+        """
+        outputs = [output for output in outputs if output != "timestamp"]
+        ledger = self.evaluate_ledger(outputs)
+        with self.profiler.stage("frame"):
+            df = ledger.frame()
+        return df[["timestamp"] + outputs]
 
-    @staticmethod
-    def subtract_months_from_timestamp(timestamp, months):
-        # TODO not working
+    def iter_ledger_chunks(self, chunk_months=12):
+        """
+        Time ordered ledgers of chunk_months months each, with the running balances carried from one to the
+        next. Only one chunk sized ledger is alive at a time and nothing is kept on the builder.
+        """
+        objects = self.staged_objects()
+        counts = [len(list(obj)) for obj in objects]
+        horizon = (self.min_timestamp, self.max_timestamp)
+        carry = None
+        start = self.min_timestamp
+        while Calendar.to_ordinal(start) <= Calendar.to_ordinal(self.max_timestamp):
+            end = min(Calendar.add_months(start, chunk_months - 1), self.max_timestamp)
+            ledger = Ledger(start, end, sum(counts), horizon=horizon)
+            self.fill_ledger(ledger, objects, counts)
+            with self.profiler.stage("cumsum"):
+                ledger.update_totals(carry=carry)
+            carry = [ledger.total(i)[-1] for i in range(3)]
+            yield ledger
+            start = Calendar.add_months(end, 1)
+
+    def iter_master_chunks(self, chunk_months=12):
+        """
+        Streaming alternative to generate_master_df, yields the master df in time ordered chunks of chunk_months
+        months, concatenating the chunks gives the generate_master_df result.
+        """
+        for ledger in self.iter_ledger_chunks(chunk_months):
+            with self.profiler.stage("frame"):
+                chunk = ledger.frame()
+            yield chunk
 
-        month = timestamp % 100
-        year = timestamp // 100
-        # added = month + (12 - months)
-        # new_month = added % 12
-        # years_passed = added // 12
-        # year = year - years_passed
-        # return year * 100 + new_month
-        ym = year * 12 - 1 + month
-        nym = ym - months
-        nm = nym % 12 + 1
-        ny = nym // 12
-        return ny * 100 + nm
+    def write_master_chunks(self, path, chunk_months=12):
+        """
+        Stream the master df straight to a file whose format is picked by extension, peak memory is one chunk
+        """
+        return get_sink(os.path.splitext(path)[1].lstrip(".") or "csv", chunk_months=chunk_months).write(self, path)
 
+    def replace_finance_object(self, old, new, frame=True):
+        """
+        Swap one finance object for another, only its contribution and the balances after the first month it
+        touches are recomputed. Falls back to a full rebuild when the horizon changes. With frame=False the
+        patched ledger is returned and master_df is left unset, for callers that only read ledger columns.
+        """
+        index = self.index_of(old)
+        in_sync = self.in_sync()
+        self.objects[index] = new
+        return self.patch(index, new, in_sync, frame)
+
+    def remove_finance_object(self, obj, frame=True):
+        index = self.index_of(obj)
+        in_sync = self.in_sync()
+        del self.objects[index]
+        return self.patch(index, None, in_sync, frame)
+
+    def index_of(self, obj):
+        for i, candidate in enumerate(self.objects):
+            if candidate is obj:
+                return i
+        raise ValueError("finance object is not part of this builder")
+
+    def in_sync(self):
+        # objects added since the last build are not in the ledger yet
+        return self.ledger is not None and len(self.records) == len(self.objects) + len(self.derived)
+
+    def patch(self, index, new, in_sync, frame=True):
+        self.update_bounds()
+        ledger = self.ledger
+        # the stages are rerun on the edited objects and their derived objects patched in place as well
+        n_derived = len(self.derived)
+        if self.stages:
+            self.staged_objects()
+        if (not in_sync or len(self.derived) != n_derived
+                or (self.min_timestamp, self.max_timestamp) != (ledger.start_timestamp, ledger.end_timestamp)):
+            return self.generate_master_df() if frame else self.build_ledger()
+
+        ledger.detach()
+        first = self.patch_object(index, new)
+        for k, obj in enumerate(self.derived):
+            first = min(first, self.patch_object(len(self.objects) + k, obj))
+
+        with self.profiler.stage("cumsum"):
+            ledger.update_totals(first)
+        self.bind_ledger()
+        if not frame:
+            self.master_df = None
+            return ledger
+        with self.profiler.stage("frame"):
+            self.master_df = ledger.frame()
+        return self.master_df
 
+    def patch_object(self, index, new):
+        """
+        Swap the ledger contribution of the object at index for new's (None removes it), returns the first
+        month whose balances changed
+        """
+        ledger = self.ledger
+        first = ledger.n_months
+        for record in self.records[index]:
+            ledger.remove_delta(record)
+            if record.first is not None:
+                first = min(first, record.first)
+
+        j = sum(self.column_counts[:index])
+        n_old = self.column_counts[index]
+        n_new = 0 if new is None else len(list(new))
+        if n_new != n_old:
+            ledger.splice_columns(j, j + n_old, n_new)
+
+        if new is None:
+            del self.records[index]
+            del self.column_counts[index]
+        else:
+            self.records[index] = self.write_object(ledger, new, j)
+            self.column_counts[index] = n_new
+            for record in self.records[index]:
+                if record.first is not None:
+                    first = min(first, record.first)
+        return first
 
 
+class Utility:
 
+    @staticmethod
+    def add_months_to_timestamp(timestamp, months):
+        return Calendar.add_months(timestamp, months)
+
+    @staticmethod
+    def subtract_months_from_timestamp(timestamp, months):
+        return Calendar.add_months(timestamp, -months)
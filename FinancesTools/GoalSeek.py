@@ -0,0 +1,148 @@
+import copy
+
+from FinancesTools.FinancesObjects import FinancesBuilder
+from FinancesTools.Pipeline import builder_pipeline, config_entries, linked_events, with_events
+from FinancesTools.Sweep import get_path, set_path
+
+
+def bisect(predicate, lo, hi, xtol=1e-6, maxiter=200):
+    """
+    Boundary of a predicate that is True at lo and False at hi, returns the last value found True
+    """
+    for _ in range(maxiter):
+        if abs(hi - lo) <= xtol:
+            break
+        mid = lo + (hi - lo) / 2
+        if predicate(mid):
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def brentq(f, a, b, xtol=1e-9, rtol=4.4e-16, maxiter=100):
+    """
+    Root of f in [a, b] by Brent's method (bisection, secant and inverse quadratic interpolation),
+    f(a) and f(b) must differ in sign
+    """
+    fa, fb = f(a), f(b)
+    if fa == 0:
+        return a
+    if fb == 0:
+        return b
+    if (fa > 0) == (fb > 0):
+        raise ValueError("f(a) and f(b) must have different signs")
+    c, fc = a, fa
+    d = e = b - a
+    for _ in range(maxiter):
+        if (fb > 0) == (fc > 0):
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol = 2 * rtol * abs(b) + xtol / 2
+        m = (c - b) / 2
+        if abs(m) <= tol or fb == 0:
+            return b
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            s = fb / fa
+            if a == c:
+                p, q = 2 * m * s, 1 - s
+            else:
+                q, r = fa / fc, fb / fc
+                p = s * (2 * m * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            p = abs(p)
+            if 2 * p < min(3 * m * q - abs(tol * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = m
+        else:
+            d = e = m
+        a, fa = b, fb
+        b += d if abs(d) > tol else (tol if m > 0 else -tol)
+        fb = f(b)
+    return b
+
+
+def stays_above(output, bound=0):
+    """
+    Constraint that output is >= bound in every month, e.g. stays_above("Cash Balance")
+    """
+    return lambda ledger: bool((ledger.column(output) >= bound).all())
+
+
+def final_value(output, target=0):
+    """
+    Objective that is zero when output ends the horizon at target, e.g. final_value("NW")
+    """
+    return lambda ledger: float(ledger.column(output)[-1] - target)
+
+
+class GoalSeek:
+    """
+    Solves for one config parameter (a dotted path as in Sweep, e.g. "loans.investment loan.loan_amount").
+    The model is built once, every evaluation only rebuilds the finance object the parameter belongs to and
+    patches its deltas and the balances after its first month into the ledger, no frame is built.
+    Constraints and objectives take the ledger, whose outputs are read with ledger.column(name).
+    """
+    def __init__(self, config, path, profiler=None):
+        self.config = copy.deepcopy(config)
+        self.path = path
+        entry = get_path(self.config, ".".join(path.split(".")[:2]))
+        for position, (section, _, cls, cfg) in enumerate(config_entries(self.config)):
+            if cfg is entry:
+                self.position, self.cls, self.entry = position, cls, cfg
+                # a loan keeps the payoffs of the asset sales that name it
+                self.events = linked_events(self.config).get(cfg['name'], []) if section == "loans" else []
+                break
+        else:
+            raise KeyError(f"{path} is not a parameter of a finance object")
+        self.builder = builder_pipeline(FinancesBuilder(profiler), self.config)
+        self.builder.build_ledger()
+        self.evaluations = 0
+
+    def evaluate(self, value):
+        """
+        Ledger of the model with the parameter set to value
+        """
+        set_path(self.config, self.path, value)
+        self.evaluations += 1
+        return self.builder.replace_finance_object(self.builder.objects[self.position], self.cls(**with_events(self.entry, self.events)), frame=False)
+
+    def max_feasible(self, constraint, lo, hi, xtol=1e-6):
+        """
+        Largest value in [lo, hi] that satisfies constraint, which must hold at lo and fail past some point
+        """
+        if not constraint(self.evaluate(lo)):
+            raise ValueError(f"constraint does not hold at {self.path} = {lo}")
+        if constraint(self.evaluate(hi)):
+            return self.solution(hi)
+        return self.solution(bisect(lambda value: constraint(self.evaluate(value)), lo, hi, xtol))
+
+    def min_feasible(self, constraint, lo, hi, xtol=1e-6):
+        """
+        Smallest value in [lo, hi] that satisfies constraint, which must hold at hi and fail below some point
+        """
+        if not constraint(self.evaluate(hi)):
+            raise ValueError(f"constraint does not hold at {self.path} = {hi}")
+        if constraint(self.evaluate(lo)):
+            return self.solution(lo)
+        return self.solution(bisect(lambda value: constraint(self.evaluate(value)), hi, lo, xtol))
+
+    def root(self, objective, lo, hi, xtol=1e-9):
+        """
+        Value in [lo, hi] where objective is zero, e.g. a break even proportion
+        """
+        return self.solution(brentq(lambda value: objective(self.evaluate(value)), lo, hi, xtol))
+
+    def solution(self, value):
+        # leave the builder and config at the solution
+        self.evaluate(value)
+        return value
+
+    def frame(self):
+        return self.builder.ledger.frame()
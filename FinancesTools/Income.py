@@ -1,28 +1,33 @@
-import pandas as pd
-from FinancesTools.FinancesObjects import FinanceObject, ColumnObject, ZeroColumn
+import numpy as np
+from FinancesTools.FinancesObjects import FinanceObject, ColumnObject, NO_DELTA
+from FinancesTools.Schedules import get_schedule
 
 
 class IncomeColumn(ColumnObject):
+    __slots__ = ("income_amount",)
+
     def __init__(self, name, start_timestamp, end_timestamp, income_amount):
         super(IncomeColumn, self).__init__(name, start_timestamp, end_timestamp)
         self.income_amount = income_amount
 
-    def get_column_df(self):
-        if self.column_df is None:
-            self.column_df = self.build_index(self.start_timestamp, self.end_timestamp)
-            self.column_df[self.name] = self.income_amount
-            return self.column_df
-        else:
-            return self.column_df
+    def get_constant(self):
+        if np.ndim(self.income_amount) == 0:
+            return self.income_amount
+        return None
+
+    def compute_values(self):
+        if np.ndim(self.income_amount) == 0:
+            return np.full(self.n_months, self.income_amount)
+        return np.asarray(self.income_amount)
 
     def get_net_cash_delta(self):
-        return self.column_df
+        return self.get_dense_delta()
 
     def get_assets_delta(self):
-        return ZeroColumn(self.name, self.start_timestamp, self.end_timestamp).get_column_df()
+        return NO_DELTA
 
     def get_liabilities_delta(self):
-        return ZeroColumn(self.name, self.start_timestamp, self.end_timestamp).get_column_df()
+        return NO_DELTA
 
 
 class SimpleIncomeStream(FinanceObject):
@@ -34,10 +39,10 @@ class SimpleIncomeStream(FinanceObject):
 class SpecifiedIncomeStream(FinanceObject):
     def __init__(self, name, csv_path, **kwargs):
         super(SpecifiedIncomeStream, self).__init__()
-        self.income_df = pd.read_csv(csv_path)
-        self.start_timestamp = min(self.income_df['timestamp'])
-        self.end_timestamp = max(self.income_df['timestamp'])
-        self.income_col = self.income_df['income'].astype(float)
+        self.schedule = get_schedule(csv_path)
+        self.start_timestamp = self.schedule.start_timestamp
+        self.end_timestamp = self.schedule.end_timestamp
+        self.income_col = self.schedule['income']
         if "percentage" in kwargs:
-            self.income_col = self.income_df['income'].astype(float) * kwargs["percentage"]
+            self.income_col = self.schedule['income'] * kwargs["percentage"]
         self.add_column_object(IncomeColumn(name, self.start_timestamp, self.end_timestamp, self.income_col))
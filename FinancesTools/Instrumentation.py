@@ -0,0 +1,77 @@
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+_NULL_STAGE = nullcontext()
+
+
+class NullProfiler:
+    """
+    Default profiler, every stage is the same shared no-op context so instrumented code costs nothing
+    """
+    enabled = False
+
+    def stage(self, name, subject=None):
+        return _NULL_STAGE
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Profiler:
+    """
+    Opt-in instrumentation: wall time, call count and (with track_memory) net bytes allocated per stage.
+    Stages that concern a finance object or column are keyed by its class, e.g. "IncomeColumn.get_column_values".
+    Hooks are called after every stage as hook(key, seconds, allocated_bytes, subject).
+    """
+    enabled = True
+
+    def __init__(self, track_memory=False, hooks=()):
+        self.track_memory = track_memory
+        self.hooks = list(hooks)
+        self.stats = {}
+        self.started_tracing = False
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    @contextmanager
+    def stage(self, name, subject=None):
+        key = name if subject is None else f"{type(subject).__name__}.{name}"
+        before = tracemalloc.get_traced_memory()[0] if self.track_memory else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            allocated = tracemalloc.get_traced_memory()[0] - before if self.track_memory else 0
+            stats = self.stats.setdefault(key, {"calls": 0, "seconds": 0.0, "bytes": 0})
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["bytes"] += allocated
+            for hook in self.hooks:
+                hook(key, seconds, allocated, subject)
+
+    def report(self):
+        """
+        Stage stats, slowest first
+        """
+        return dict(sorted(self.stats.items(), key=lambda item: item[1]["seconds"], reverse=True))
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame.from_dict(self.report(), orient="index")
+
+    def close(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+
+def print_hook(key, seconds, allocated, subject):
+    # verbose mode, what the builder used to print unconditionally
+    name = getattr(subject, "name", "")
+    print(f"{key} {name} {seconds * 1000:.3f}ms {allocated}B")
@@ -0,0 +1,354 @@
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from FinancesTools.Calendar import Calendar
+from FinancesTools.Deltas import SparseDelta, DenseDelta, is_no_delta
+
+# one column's contribution to an accumulator, kept so it can be taken back out on an incremental edit
+DeltaRecord = namedtuple("DeltaRecord", ["accumulator", "where", "values", "int_ok", "first"])
+
+
+class Ledger:
+    """
+    Dense months x columns value matrix plus the net cash / assets / liabilities delta accumulators.
+    Every column writes into its own slice by integer month offset, one DataFrame is built at the end.
+    """
+    totals = ["Cash Balance", "Assets", "Liabilities", "NW"]
+
+    def __init__(self, start_timestamp, end_timestamp, n_columns, accumulator_names=("net_cash", "net assets", "net liabilities"), horizon=None):
+        self.start_timestamp = start_timestamp
+        self.end_timestamp = end_timestamp
+        self.start_ordinal = Calendar.to_ordinal(start_timestamp)
+        self.n_months = Calendar.n_months(start_timestamp, end_timestamp)
+        # full model horizon when this ledger only holds a window of it (streaming), decides integer dtypes
+        self.horizon = tuple(horizon) if horizon is not None else (start_timestamp, end_timestamp)
+        self.horizon_ordinal = Calendar.to_ordinal(self.horizon[0])
+        self.horizon_months = Calendar.n_months(*self.horizon)
+        self.accumulator_names = list(accumulator_names)
+        self.names = [None] * n_columns
+        # one block for instrument columns, accumulators and totals so the final frame needs no concatenation
+        self.bind(np.zeros((self.n_months, n_columns + len(self.accumulator_names) + len(Ledger.totals))), n_columns)
+        # pandas keeps integer dtype for a column only when the left merge never introduced a NaN
+        self.int_columns = set()
+        self.float_deltas = [0, 0, 0]
+        # frames share the matrix, it is copied before the first edit after one was handed out
+        self.shared = False
+
+    def bind(self, matrix, n_columns):
+        self.matrix = matrix
+        self.n_columns = n_columns
+        self.values = matrix[:, :n_columns]
+        self.net_cash = matrix[:, n_columns]
+        self.assets = matrix[:, n_columns + 1]
+        self.liabilities = matrix[:, n_columns + 2]
+
+    def accumulator(self, i):
+        return self.matrix[:, self.n_columns + i]
+
+    def accumulators(self):
+        # months x 3 view of net cash, assets and liabilities
+        return self.matrix[:, self.n_columns:self.n_columns + len(self.accumulator_names)]
+
+    def total(self, i):
+        return self.matrix[:, self.n_columns + len(self.accumulator_names) + i]
+
+    def column(self, name):
+        """
+        View of one output column by name: a total, an accumulator or an instrument column
+        """
+        if name in Ledger.totals:
+            return self.total(Ledger.totals.index(name))
+        if name in self.accumulator_names:
+            return self.accumulator(self.accumulator_names.index(name))
+        return self.values[:, self.names.index(name)]
+
+    def months(self):
+        return Calendar.month_range(self.start_timestamp, self.end_timestamp)
+
+    def locate(self, timestamps):
+        """
+        Offsets of timestamps into the ledger, as a slice when contiguous. Months outside the ledger are dropped
+        like a left merge on timestamp would.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        offsets = Calendar.to_ordinal(timestamps) - self.start_ordinal
+        inside = (offsets >= 0) & (offsets < self.n_months)
+        if not inside.all():
+            return offsets[inside], inside
+        if len(offsets) and offsets[-1] - offsets[0] + 1 == len(offsets) and (np.diff(offsets) == 1).all():
+            return slice(int(offsets[0]), int(offsets[-1]) + 1), None
+        return offsets, None
+
+    @staticmethod
+    def first_offset(where):
+        if isinstance(where, slice):
+            return where.start
+        return int(where.min()) if len(where) else None
+
+    @staticmethod
+    def split_frame(df):
+        name = [c for c in df.columns if c != "timestamp"][0]
+        return df["timestamp"].to_numpy(), df[name].to_numpy()
+
+    def spans_horizon(self, start_timestamp, n_months):
+        return Calendar.to_ordinal(start_timestamp) == self.horizon_ordinal and n_months == self.horizon_months
+
+    def frame_spans_horizon(self, timestamps):
+        return len(timestamps) > 0 and self.spans_horizon(timestamps[0], len(timestamps)) and \
+            Calendar.to_ordinal(timestamps[-1]) - self.horizon_ordinal + 1 == self.horizon_months
+
+    @staticmethod
+    def clean(values):
+        values = np.asarray(values)
+        is_int = np.issubdtype(values.dtype, np.integer)
+        values = values.astype(np.float64, copy=False)
+        if not is_int:
+            values = np.where(np.isnan(values), 0.0, values)
+        return values, is_int
+
+    def clip(self, start_timestamp, values, n_months):
+        """
+        Rows [lo, hi) of the ledger covered by a run of n_months months from start_timestamp and the matching
+        part of its values, a scalar applies to every month
+        """
+        offset = Calendar.to_ordinal(start_timestamp) - self.start_ordinal
+        lo, hi = max(offset, 0), min(offset + n_months, self.n_months)
+        if np.ndim(values):
+            values = values[lo - offset:hi - offset]
+        return lo, hi, values
+
+    def write_values(self, j, name, start_timestamp, values, n_months=None):
+        """
+        Write a column given as its start month and one value per month (or a scalar for n_months months),
+        clipped to the ledger's months
+        """
+        self.names[j] = name
+        n_months = len(values) if n_months is None else n_months
+        values, is_int = Ledger.clean(values)
+        lo, hi, values = self.clip(start_timestamp, values, n_months)
+        self.values[:, j] = 0
+        if lo < hi:
+            self.values[lo:hi, j] = values
+        self.mark_int_column(j, is_int and self.spans_horizon(start_timestamp, n_months))
+
+    def skip_column(self, j, name):
+        # column has no months in this window, it is zero here and cannot span the horizon
+        self.names[j] = name
+        self.values[:, j] = 0
+        self.mark_int_column(j, False)
+        for i in range(3):
+            self.float_deltas[i] += 1
+
+    def mark_int_column(self, j, is_int):
+        if is_int:
+            self.int_columns.add(j)
+        else:
+            self.int_columns.discard(j)
+
+    def add_delta(self, i, delta, span=None):
+        if is_no_delta(delta):
+            # a merged zero frame only kept the accumulator integer when it spanned every month
+            int_ok = span is None or tuple(span) == self.horizon
+            self.float_deltas[i] += not int_ok
+            return DeltaRecord(i, None, None, int_ok, None)
+        if isinstance(delta, DenseDelta):
+            return self.add_dense_delta(i, delta)
+        if isinstance(delta, SparseDelta):
+            timestamps, values = delta.timestamps, delta.values
+        else:
+            timestamps, values = Ledger.split_frame(delta)
+        values, is_int = Ledger.clean(values)
+        where, mask = self.locate(timestamps)
+        if mask is not None:
+            values = values[mask]
+        accumulator = self.accumulator(i)
+        accumulator[where] = accumulator[where] + values
+        int_ok = is_int and self.frame_spans_horizon(timestamps)
+        self.float_deltas[i] += not int_ok
+        return DeltaRecord(i, where, values, int_ok, Ledger.first_offset(where))
+
+    def add_dense_delta(self, i, delta):
+        values, is_int = Ledger.clean(delta.values)
+        lo, hi, values = self.clip(delta.start_timestamp, values, delta.n_months)
+        int_ok = is_int and self.spans_horizon(delta.start_timestamp, delta.n_months)
+        self.float_deltas[i] += not int_ok
+        if lo >= hi:
+            return DeltaRecord(i, None, None, int_ok, None)
+        where = slice(lo, hi)
+        accumulator = self.accumulator(i)
+        accumulator[where] = accumulator[where] + values
+        return DeltaRecord(i, where, values, int_ok, lo)
+
+    def remove_delta(self, record):
+        self.float_deltas[record.accumulator] -= not record.int_ok
+        if record.where is not None:
+            accumulator = self.accumulator(record.accumulator)
+            accumulator[record.where] = accumulator[record.where] - record.values
+
+    def add_net_cash_delta(self, delta, span=None):
+        return self.add_delta(0, delta, span)
+
+    def add_assets_delta(self, delta, span=None):
+        return self.add_delta(1, delta, span)
+
+    def add_liabilities_delta(self, delta, span=None):
+        return self.add_delta(2, delta, span)
+
+    def place(self, j, names, int_columns, float_deltas):
+        """
+        Names and dtypes of a block of columns from j on whose values were copied in from a ledger of the same
+        months (see FinancesBuilder.write_block)
+        """
+        self.names[j:j + len(names)] = names
+        self.int_columns.update(j + k for k in int_columns)
+        self.float_deltas = [a + b for a, b in zip(self.float_deltas, float_deltas)]
+
+    @staticmethod
+    def pack_records(records):
+        """
+        Lists of DeltaRecords (one per object) as a few flat arrays, which pickle far faster than the records
+        """
+        flat = [record for object_records in records for record in object_records]
+        table = np.zeros((len(flat), 5), dtype=np.int64)
+        indices, values = [], []
+        position = 0
+        for row, record in zip(table, flat):
+            row[0], row[1] = record.accumulator, record.int_ok
+            if isinstance(record.where, slice):
+                row[2:] = 1, record.where.start, record.where.stop
+            elif record.where is not None:
+                row[2:] = 2, position, position + len(record.where)
+                position += len(record.where)
+                indices.append(record.where)
+            if record.where is not None:
+                # constant columns keep a scalar
+                values.append(np.broadcast_to(record.values, row[4] - row[3]))
+        lengths = np.array([len(object_records) for object_records in records], dtype=np.int64)
+        indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+        values = np.concatenate(values) if values else np.zeros(0)
+        return lengths, table, indices, values
+
+    @staticmethod
+    def unpack_records(packed):
+        lengths, table, indices, values = packed
+        flat = []
+        position = 0
+        for accumulator, int_ok, kind, a, b in table.tolist():
+            if kind == 0:
+                flat.append(DeltaRecord(accumulator, None, None, bool(int_ok), None))
+                continue
+            where = slice(a, b) if kind == 1 else indices[a:b]
+            flat.append(DeltaRecord(accumulator, where, values[position:position + b - a], bool(int_ok), Ledger.first_offset(where)))
+            position += b - a
+        ends = np.cumsum(lengths).tolist()
+        return [flat[end - n:end] for n, end in zip(lengths.tolist(), ends)]
+
+    @staticmethod
+    def pairwise_sum(parts):
+        """
+        Sum of parts combined pairwise in a fixed order, ((p0 + p1) + (p2 + p3)) + ..., a single part as is
+        """
+        parts = list(parts)
+        while len(parts) > 1:
+            parts = [parts[k] + parts[k + 1] if k + 1 < len(parts) else parts[k] for k in range(0, len(parts), 2)]
+        return parts[0]
+
+    def splice_columns(self, start, stop, n_new):
+        """
+        Replace columns [start, stop) with n_new zeroed columns, accumulators and totals are carried over
+        """
+        shift = n_new - (stop - start)
+        matrix = np.zeros((self.n_months, self.matrix.shape[1] + shift))
+        matrix[:, :start] = self.matrix[:, :start]
+        matrix[:, start + n_new:] = self.matrix[:, stop:]
+        self.names = self.names[:start] + [None] * n_new + self.names[stop:]
+        self.int_columns = {j if j < start else j + shift for j in self.int_columns if not start <= j < stop}
+        self.bind(matrix, self.n_columns + shift)
+        self.shared = False
+
+    def detach(self):
+        if self.shared:
+            self.bind(self.matrix.copy(), self.n_columns)
+            self.shared = False
+
+    def update_totals(self, first=0, carry=None):
+        """
+        Running balances from month offset first on, carry holds the balances before this ledger's first month
+        when it is one window of a longer horizon. Seeding the cumsum with the previous balance keeps the
+        result identical to a cumsum over the whole horizon.
+        """
+        if first >= self.n_months:
+            return
+        for i in range(3):
+            accumulator, total = self.accumulator(i), self.total(i)
+            if first == 0 and carry is None:
+                np.cumsum(accumulator, out=total)
+            else:
+                tail = accumulator[first:].copy()
+                tail[0] += total[first - 1] if first > 0 else carry[i]
+                np.cumsum(tail, out=total[first:])
+        cash, assets, liabilities, nw = [self.total(i)[first:] for i in range(4)]
+        np.add(cash + assets, liabilities, out=nw)
+
+    def output_names(self):
+        return self.names + self.accumulator_names + Ledger.totals
+
+    def int_outputs(self):
+        """
+        Matrix columns that hold integers, the pandas dtype the left merges would have produced
+        """
+        n_accumulators = len(self.accumulator_names)
+        int_accumulators = [n == 0 for n in self.float_deltas]
+        outputs = set(self.int_columns)
+        for i, is_int in enumerate(int_accumulators):
+            if is_int:
+                outputs.update([self.n_columns + i, self.n_columns + n_accumulators + i])
+        if all(int_accumulators):
+            outputs.add(self.n_columns + n_accumulators + Ledger.totals.index("NW"))
+        return outputs
+
+    def frame(self):
+        import pandas as pd
+        df = pd.DataFrame(self.matrix, columns=self.output_names(), copy=False)
+        self.shared = True
+        df.insert(0, "timestamp", self.months().copy())
+        for k in sorted(self.int_outputs()):
+            df.isetitem(k + 1, df.iloc[:, k + 1].astype(np.int64))
+        return df
+
+    def save(self, directory):
+        """
+        Matrix as matrix.npy plus what frame() needs to restore dtypes and names as meta.json
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "matrix.npy"), self.matrix)
+        meta = {
+            "start_timestamp": int(self.start_timestamp),
+            "end_timestamp": int(self.end_timestamp),
+            "horizon": [int(t) for t in self.horizon],
+            "n_columns": self.n_columns,
+            "names": self.names,
+            "accumulator_names": self.accumulator_names,
+            "int_columns": sorted(self.int_columns),
+            "float_deltas": self.float_deltas,
+        }
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    @staticmethod
+    def load(directory):
+        """
+        Ledger saved by save(), its matrix is a read only memory map that is copied before any edit
+        """
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        ledger = Ledger(meta["start_timestamp"], meta["end_timestamp"], 0, meta["accumulator_names"], meta["horizon"])
+        ledger.bind(np.load(os.path.join(directory, "matrix.npy"), mmap_mode="r"), meta["n_columns"])
+        ledger.names = meta["names"]
+        ledger.int_columns = set(meta["int_columns"])
+        ledger.float_deltas = meta["float_deltas"]
+        ledger.shared = True
+        return ledger
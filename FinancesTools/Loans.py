@@ -1,101 +1,276 @@
-import pandas as pd
 import numpy as np
 
-import FinancesTools.FinancesObjects
-from FinancesTools.FinancesObjects import FinanceObject, ColumnObject, ZeroColumn, SpecifiedColumn
+from FinancesTools.Calendar import Calendar
+from FinancesTools.Deltas import SparseDelta
+from FinancesTools.FinancesObjects import FinanceObject, ColumnObject, SpecifiedColumn, NO_DELTA
 from FinancesTools.Income import IncomeColumn
 
 
 class MonthlyCostCol(IncomeColumn):
     # should hit cash col like income col already does
+    __slots__ = ()
+
     def __init__(self, name, start_timestamp, end_timestamp, cost_amount):
         super(MonthlyCostCol, self).__init__(name, start_timestamp, end_timestamp, -1*cost_amount)
 
 
 class OneTimePayment(IncomeColumn):
     # hits cash (default)
+    __slots__ = ()
+
     def __init__(self, name, timestamp, amount):
         super(OneTimePayment, self).__init__(name, timestamp, timestamp, amount)
 
+    def get_sparse_delta(self):
+        # only touches one month, no need to hand the builder a frame
+        return SparseDelta(self.start_timestamp, self.income_amount)
+
+    def get_net_cash_delta(self):
+        return self.get_sparse_delta()
+
 
 class OneTimeLiability(OneTimePayment):
+    __slots__ = ()
+
     def __init__(self, name, timestamp, amount):
         super(OneTimePayment, self).__init__(name, timestamp, timestamp, -1*amount)
 
     def get_net_cash_delta(self):
         # doesnt hit cash
-        return ZeroColumn(self.name, self.start_timestamp, self.end_timestamp).get_column_df()
+        return NO_DELTA
 
     def get_liabilities_delta(self):
         # hits liabilities
-        return self.column_df
+        return self.get_sparse_delta()
 
 
 class LoanInterestPaid(SpecifiedColumn):
+    __slots__ = ()
+
     def __init__(self, name, start_timestamp, end_timestamp, column_values):
         super(LoanInterestPaid, self).__init__(name, start_timestamp, end_timestamp, column_values)
 
     def get_net_cash_delta(self):
         # Doesnt impact net columns, just shows the interest portion of loan payment
-        return ZeroColumn(self.name, self.start_timestamp, self.end_timestamp).get_column_df()
+        return NO_DELTA
 
 class LoanPrinciplePaid(SpecifiedColumn):
+    __slots__ = ()
+
     def __init__(self, name, start_timestamp, end_timestamp, column_values):
         super(LoanPrinciplePaid, self).__init__(name, start_timestamp, end_timestamp, column_values)
 
     def get_net_cash_delta(self):
         # Doesnt impact net cash, this portion applied to liabilities
-        return ZeroColumn(self.name, self.start_timestamp, self.end_timestamp).get_column_df()
+        return NO_DELTA
 
     def get_liabilities_delta(self):
         # hits liabilities - principal portion of loan payment pays down what you owe
-        return self.get_column_df()
+        return self.get_dense_delta()
+
+
+class ExtraPrincipal(ColumnObject):
+    # prepayments and payoffs, only the event months are stored: out of cash and off the liability
+    __slots__ = ("timestamps", "amounts")
+
+    def __init__(self, name, timestamps, amounts):
+        super(ExtraPrincipal, self).__init__(name, timestamps[0], timestamps[-1])
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.amounts = np.asarray(amounts, dtype=float)
+
+    def compute_values(self):
+        values = np.zeros(self.n_months)
+        values[Calendar.to_ordinal(self.timestamps) - self.start_ordinal] = self.amounts
+        return values
+
+    def get_net_cash_delta(self):
+        return SparseDelta(self.timestamps, -self.amounts)
+
+    def get_assets_delta(self):
+        return NO_DELTA
+
+    def get_liabilities_delta(self):
+        return SparseDelta(self.timestamps, self.amounts)
 
 
 class Loan(FinanceObject):
-    def __init__(self, name, start_timestamp, end_timestamp, loan_amount, rate):
+    """
+    Level payment loan. events, e.g. [{"timestamp": 202801, "type": "prepayment", "amount": 20000}], change it
+    from their month on: "prepayment" pays extra principal, "rate_reset" changes the annual "rate" (a refinance)
+    and "payoff" pays the remaining balance. The payment is recast over the remaining term after each one and
+    only the schedule from the event's month on is recomputed.
+    """
+    event_types = ("prepayment", "rate_reset", "payoff")
+
+    def __init__(self, name, start_timestamp, end_timestamp, loan_amount, rate, payment_per_month=None, schedule=None, events=None):
         super(Loan, self).__init__()
+        self.name = name
         self.zero_day = start_timestamp
-        self.start = FinancesTools.FinancesObjects.Utility.add_months_to_timestamp(start_timestamp, 1)
-        self.end = FinancesTools.FinancesObjects.Utility.add_months_to_timestamp(end_timestamp, 1)
+        self.start = Calendar.add_months(start_timestamp, 1)
+        self.end = Calendar.add_months(end_timestamp, 1)
         self.rate = rate
         self.amount = loan_amount
-        self.add_column_object(MonthlyCostCol(f"{name} service", self.start, self.end, self.get_loan_payment()))
+        # bulk loads hand in the payment and (interest, principal) rows of one batched amortization, otherwise
+        # the schedule is computed on first use by either column, in a parallel build by a block worker
+        self.payment_per_month = payment_per_month
+        self.schedule = schedule
+        self.service = MonthlyCostCol(f"{name} service", self.start, self.end, self.get_loan_payment())
+        self.add_column_object(self.service)
         self.add_column_object(OneTimePayment(f"{name} cash", self.zero_day, loan_amount))
         self.add_column_object(OneTimeLiability(f"{name} liability", self.zero_day, loan_amount))
-        interest, principal = self.get_interest_and_principal()
+        interest, principal = schedule if schedule is not None else (self.get_interest, self.get_principal)
         # print(interest)
         # print(principal)
         # raise("test")
-        self.add_column_object(LoanInterestPaid(f"{name} interest", self.start, self.end, interest))
-        self.add_column_object(LoanPrinciplePaid(f"{name} principal", self.start, self.end, principal))
+        self.interest = LoanInterestPaid(f"{name} interest", self.start, self.end, interest)
+        self.principal = LoanPrinciplePaid(f"{name} principal", self.start, self.end, principal)
+        self.add_column_object(self.interest)
+        self.add_column_object(self.principal)
 
-    def get_loan_payment(self):
-        df = ColumnObject.build_index(self.start, self.end)
-        discount_factors = 1 / ((1 + self.rate / 12) ** (df.index.to_numpy() + 1))
-        payment_per_month = self.amount / discount_factors.sum()
-        return payment_per_month
+        # sorted (payment index, type, amount or rate, principal paid) tuples, the schedule arrays are only
+        # materialized per month once there is an event
+        self.events = []
+        self.extra = None
+        for event in events or ():
+            self.add_event(event, recompute=False)
+        if self.events:
+            self.recompute(self.events[0][0])
 
-    def get_interest_and_principal(self):
-        pmt = self.get_loan_payment()
-        payments = [pmt for i in range(len(ColumnObject.build_index(self.start, self.end)))]
-        loan_balance = self.amount
-        interest_paid = []
-        principal_paid = []
-        for payment in payments:
-            interest_paid.append(loan_balance*self.rate/12)
-            principal_paid.append(payment - interest_paid[-1])
-            loan_balance = loan_balance - principal_paid[-1]
+    @staticmethod
+    def payment(amount, rate, n_months):
+        """
+        Level monthly payment, broadcasts over arrays of amounts / annual rates / terms
+        """
+        amount, monthly_rate, n_months = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (amount, np.asarray(rate) / 12, n_months)])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pmt = amount * monthly_rate / -np.expm1(-n_months * np.log1p(monthly_rate))
+        return np.where(monthly_rate == 0, amount / n_months, pmt)
 
-        return np.array(interest_paid), np.array(principal_paid)
+    @staticmethod
+    def amortization_schedule(amount, rate, n_months):
+        """
+        Closed form interest and principal portions of each payment. Scalars give 1-D schedules, arrays of
+        (amount, rate, term) give a (n_loans, max_term) 2-D batch padded with zeros past each loan's term.
+        principal_k = (pmt - amount * r) * (1 + r) ** (k - 1), interest_k = pmt - principal_k
+        """
+        amount, rate, n_months = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (amount, rate, n_months)])
+        pmt = Loan.payment(amount, rate, n_months)[..., None]
+        monthly_rate = rate[..., None] / 12
+        periods = np.arange(int(n_months.max()) if n_months.size else 0)
+        growth = np.exp(periods * np.log1p(monthly_rate))
+        principal = (pmt - amount[..., None] * monthly_rate) * growth
+        interest = pmt - principal
+        in_term = periods < n_months[..., None]
+        return np.where(in_term, interest, 0.0), np.where(in_term, principal, 0.0)
 
+    def get_loan_payment(self):
+        if self.payment_per_month is None:
+            self.payment_per_month = Loan.payment(self.amount, self.rate, Calendar.n_months(self.start, self.end))[()]
+        return self.payment_per_month
+
+    def get_interest_and_principal(self):
+        return Loan.amortization_schedule(self.amount, self.rate, Calendar.n_months(self.start, self.end))
 
+    def amortization(self):
+        if self.schedule is None:
+            self.schedule = self.get_interest_and_principal()
+        return self.schedule
 
+    def get_interest(self):
+        return self.amortization()[0]
 
+    def get_principal(self):
+        return self.amortization()[1]
 
+    @staticmethod
+    def segment(balance, rate, n_remaining, n_months):
+        """
+        Payment and the first n_months interest / principal portions of balance amortized over n_remaining months
+        """
+        pmt = Loan.payment(balance, rate, n_remaining)[()]
+        monthly_rate = rate / 12
+        principal = (pmt - balance * monthly_rate) * np.exp(np.arange(n_months) * np.log1p(monthly_rate))
+        return pmt, pmt - principal, principal
 
+    def add_event(self, event, recompute=True):
+        """
+        Add an event ({"timestamp", "type", "amount" / "rate"}) and recompute the schedule from its month on, a
+        builder picks the change up with replace_finance_object(loan, loan)
+        """
+        if event["type"] not in Loan.event_types:
+            raise ValueError(f"unknown loan event {event['type']}, expected one of {Loan.event_types}")
+        Calendar.check(event["timestamp"])
+        if not self.start <= event["timestamp"] <= self.end:
+            raise ValueError(f"{self.name} event at {event['timestamp']} is outside its payments {self.start} - {self.end}")
+        k = Calendar.offsets(event["timestamp"], self.start)
+        value = event["rate"] if event["type"] == "rate_reset" else event["amount"] if event["type"] == "prepayment" else None
+        position = sum(other[0] <= k for other in self.events)
+        self.events.insert(position, (k, event["type"], value, 0.0))
+        if recompute:
+            self.recompute(k)
+        return self
 
+    def state_at(self, k):
+        # rate and extra principal paid before payment index k
+        rate, prepaid = self.rate, 0.0
+        for month, kind, value, paid in self.events:
+            if month >= k:
+                break
+            prepaid += paid
+            if kind == "rate_reset":
+                rate = value
+        return rate, prepaid
 
+    def recompute(self, k):
+        """
+        Rebuild the payments, interest, principal and extra principal from payment index k on, one closed form
+        segment between consecutive events. Balances are always taken as the amount less the principal and
+        extra principal paid so far, so building with every event at once or adding them one at a time gives
+        identical schedules.
+        """
+        n = Calendar.n_months(self.start, self.end)
+        # fresh arrays, the old ones may be views of a bulk loaded batch or still referenced by a ledger's records
+        payments = -np.broadcast_to(self.service.income_amount, n).astype(float)
+        interest = np.array(self.interest.column, dtype=float)
+        principal = np.array(self.principal.column, dtype=float)
+        rate, prepaid = self.state_at(k)
 
+        start = k
+        for i, (month, kind, value, _) in enumerate(self.events + [(n, None, None, 0.0)]):
+            if month < k:
+                continue
+            if month > start:
+                balance = self.amount - float(np.sum(principal[:start])) - prepaid
+                pmt, interest[start:month], principal[start:month] = Loan.segment(balance, rate, n - start, month - start)
+                payments[start:month] = pmt
+                start = month
+            if kind == "rate_reset":
+                rate = value
+            elif kind in ("prepayment", "payoff"):
+                balance = self.amount - float(np.sum(principal[:month])) - prepaid
+                paid = balance if kind == "payoff" else min(value, balance)
+                self.events[i] = (month, kind, value, paid)
+                prepaid += paid
 
+        # 0.0 - keeps the months after a payoff at 0.0 instead of -0.0
+        self.service.income_amount = 0.0 - payments
+        self.service.invalidate()
+        self.interest.column = interest
+        self.principal.column = principal
+        self.update_extra()
 
+    def update_extra(self):
+        # one entry per month, a sparse delta can not repeat a month
+        payments = {}
+        for month, kind, _, paid in self.events:
+            if kind != "rate_reset":
+                payments[month] = payments.get(month, 0.0) + paid
+        if not payments:
+            return
+        timestamps = Calendar.add_months(self.start, np.fromiter(payments, dtype=np.int64))
+        extra = ExtraPrincipal(f"{self.name} extra principal", timestamps, list(payments.values()))
+        if self.extra is None:
+            self.add_column_object(extra)
+        else:
+            self.columns[self.columns.index(self.extra)] = extra
+        self.extra = extra
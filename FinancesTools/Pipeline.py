@@ -0,0 +1,102 @@
+from FinancesTools.Income import SimpleIncomeStream, SpecifiedIncomeStream
+from FinancesTools.Loans import Loan
+from FinancesTools.Assets import CashFlowAsset
+from FinancesTools.Taxes import TaxStage
+
+
+def construct(builder, cls, cfg, cache=None):
+    # an unchanged entry reuses the object, and its memoized schedules, from the run cache
+    obj = cache.get_object(cls, cfg) if cache is not None else None
+    if obj is None:
+        with builder.profiler.stage(f"{cls.__name__}.__init__"):
+            obj = cls(**cfg)
+        if cache is not None:
+            cache.put_object(cls, cfg, obj)
+    builder.add_finance_object(obj)
+    return obj
+
+
+def config_entries(config):
+    """
+    (section, index, class, entry) for every config entry that becomes a finance object, in the order
+    builder_pipeline adds them to the builder
+    """
+    for i, ln in enumerate(config.get('loans', [])):
+        yield "loans", i, Loan, ln
+
+    for i, cfg in enumerate(config.get('assets', [])):
+        yield "assets", i, CashFlowAsset, cfg
+
+    for i, cfg in enumerate(config.get('incomes', [])):
+        if "type" in cfg:
+            if cfg['type'] == "manual_schedule":
+                yield "incomes", i, SpecifiedIncomeStream, cfg
+        else:
+            yield "incomes", i, SimpleIncomeStream, cfg
+
+
+def linked_events(config):
+    """
+    {loan name: [payoff events]} from the asset sales that name a loan to pay off, e.g.
+    {"timestamp": 203001, "type": "sale", "payoff": "investment loan"}. The asset and the loan never reference
+    each other, the pipeline hands the loan a payoff event in the sale month.
+    """
+    loans = {ln['name'] for ln in config.get('loans', [])}
+    events = {}
+    for cfg in config.get('assets', []):
+        for event in cfg.get('events', []):
+            if event['type'] == "sale" and "payoff" in event:
+                if event['payoff'] not in loans:
+                    raise ValueError(f"{cfg['name']} sale pays off {event['payoff']}, which is not a loan")
+                events.setdefault(event['payoff'], []).append({"timestamp": event['timestamp'], "type": "payoff"})
+    return events
+
+
+def with_events(cfg, events):
+    # the entry with events appended, the config entry itself is left as is
+    return dict(cfg, events=list(cfg.get('events', [])) + events) if events else cfg
+
+
+def builder_pipeline(builder, config, cache=None):
+
+    # if "fixed_incomes" in config:
+    #     for fi in config['fixed_incomes']:
+    #         builder.add_object(FixedIncome(**fi))
+    #
+    # if "salaries" in config:
+    #     for s in config['salaries']:
+    #         builder.add_object(Salary(**s))
+    #
+    # if "taxed_salaries" in config:
+    #     for s in config['taxed_salaries']:
+    #         builder.add_object(TaxedSalary(**s))
+    #
+    # if "one_time_payments" in config:
+    #     for otp in config['one_time_payments']:
+    #         builder.add_object(OneTimePayment(**otp))
+    #
+    # if "one_time_gifts" in config:
+    #     for cfg in config['one_time_gifts']:
+    #         builder.add_object(OneTimeGift(**cfg))
+    #
+    # if "monthly_expenses" in config:
+    #     for me in config['monthly_expenses']:
+    #         builder.add_object(MonthlyExpense(**me))
+    #
+
+    linked = linked_events(config)
+    for section, index, cls, cfg in config_entries(config):
+        if section == "loans":
+            cfg = with_events(cfg, linked.get(cfg['name'], []))
+        construct(builder, cls, cfg, cache)
+
+    # large portfolios, e.g. "tables": {"loans": "loan_book.parquet"}, see FinancesTools.BulkLoader
+    if "tables" in config:
+        from FinancesTools.BulkLoader import load_tables
+        load_tables(builder, config['tables'])
+
+    # e.g. "taxes": {"brackets": [[0, 0.0], [14600, 0.1], [26200, 0.12]], "indexing": 0.02, "exclude": ["cash start"]}
+    if "taxes" in config:
+        builder.add_stage(TaxStage(**config['taxes']))
+
+    return builder
@@ -0,0 +1,178 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from collections import OrderedDict
+from functools import lru_cache
+
+from FinancesTools.Ledger import Ledger
+from FinancesTools.Schedules import ScheduleStore, referenced_schedules
+
+# (path, mtime, size) -> sha256, so unchanged files are hashed once per process
+_digests = {}
+
+
+def file_digest(path):
+    key = (os.path.abspath(path),) + ScheduleStore.stamp(path)
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+
+@lru_cache(maxsize=1)
+def code_digest():
+    # results are only reusable by the model code that produced them, which can not change under a running process
+    sources = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py")))
+    return hashlib.sha256("".join(file_digest(path) for path in sources).encode()).hexdigest()
+
+
+def referenced_files(config):
+    """
+    Schedule csvs (csv_path / csv_loc) and bulk tables a config reads
+    """
+    paths = referenced_schedules(config)
+    if isinstance(config, dict):
+        paths += [table for table in config.get("tables", {}).values() if isinstance(table, str)]
+    return paths
+
+
+def content_key(config, *extra):
+    """
+    Hash of the normalized config, the content of every file it references and the model code
+    """
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True, separators=(",", ":"), default=str).encode())
+    for path in referenced_files(config):
+        digest.update(file_digest(path).encode())
+    for value in extra:
+        digest.update(str(value).encode())
+    digest.update(code_digest().encode())
+    return digest.hexdigest()
+
+
+class RunCache:
+    """
+    Content addressed cache of built ledgers (a hit skips the whole model run) and of finance objects (an
+    unchanged loan or asset is reused with its memoized schedules when other config entries change). Entries
+    live under directory and are evicted least recently used first past max_entries ledgers / max_objects
+    objects or max_bytes in total. Objects are also kept in memory, shared between the builders that use them,
+    with directory=None that is the only place they are kept.
+    """
+    # config entries that do not change the ledger
+    ignored_keys = ("plotting", "profile", "output", "schedule_sidecars", "cache", "scenarios", "workers",
+                    "headless")
+
+    def __init__(self, directory=".run_cache", max_entries=32, max_objects=4096, max_bytes=2 ** 30):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_objects = max_objects
+        self.max_bytes = max_bytes
+        self.objects = OrderedDict()
+        # objects built this run, written to disk by save_objects once their schedules are computed
+        self.pending = {}
+
+    def ledger_dir(self):
+        return os.path.join(self.directory, "ledgers")
+
+    def object_dir(self):
+        return os.path.join(self.directory, "objects")
+
+    def key(self, config):
+        return content_key({k: v for k, v in config.items() if k not in RunCache.ignored_keys})
+
+    def get(self, key):
+        path = os.path.join(self.ledger_dir(), key)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        os.utime(path)
+        return Ledger.load(path)
+
+    def put(self, key, ledger):
+        path = os.path.join(self.ledger_dir(), key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        ledger.save(tmp)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+        self.evict()
+
+    @staticmethod
+    def object_key(cls, cfg):
+        return content_key(cfg, cls.__module__, cls.__qualname__)
+
+    def get_object(self, cls, cfg):
+        key = RunCache.object_key(cls, cfg)
+        if key in self.objects:
+            self.objects.move_to_end(key)
+            return self.objects[key]
+        if self.directory is None:
+            return None
+        path = os.path.join(self.object_dir(), f"{key}.pkl")
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        with open(path, "rb") as f:
+            obj = pickle.load(f)
+        self.remember(key, obj)
+        return obj
+
+    def put_object(self, cls, cfg, obj):
+        key = RunCache.object_key(cls, cfg)
+        self.remember(key, obj)
+        if self.directory is not None:
+            self.pending[key] = obj
+
+    def remember(self, key, obj):
+        self.objects[key] = obj
+        self.objects.move_to_end(key)
+        while len(self.objects) > self.max_objects:
+            self.objects.popitem(last=False)
+
+    def save_objects(self):
+        os.makedirs(self.object_dir(), exist_ok=True)
+        for key, obj in self.pending.items():
+            path = os.path.join(self.object_dir(), f"{key}.pkl")
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        self.pending = {}
+        self.evict()
+
+    @staticmethod
+    def size(path):
+        if os.path.isdir(path):
+            return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        return os.path.getsize(path)
+
+    def evict(self):
+        """
+        Drop least recently used entries until both kinds are within their count and together within max_bytes
+        """
+        entries = []
+        for directory, limit in [(self.ledger_dir(), self.max_entries), (self.object_dir(), self.max_objects)]:
+            if not os.path.isdir(directory):
+                continue
+            paths = [os.path.join(directory, name) for name in os.listdir(directory) if not name.endswith(".tmp")]
+            paths.sort(key=os.path.getmtime, reverse=True)
+            for path in paths[limit:]:
+                RunCache.remove(path)
+            entries.extend(paths[:limit])
+
+        entries.sort(key=os.path.getmtime, reverse=True)
+        total = 0
+        for path in entries:
+            total += RunCache.size(path)
+            if total > self.max_bytes:
+                RunCache.remove(path)
+
+    @staticmethod
+    def remove(path):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
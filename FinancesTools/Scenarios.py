@@ -0,0 +1,116 @@
+import numpy as np
+
+from FinancesTools.Calendar import Calendar
+from FinancesTools.Schedules import get_schedule
+
+
+class AppreciationModel:
+    """
+    Distribution of month over month growth factors for a CashFlowAsset. Paths are generated as one
+    (n_paths, n_steps) array, the deterministic run uses the expected path.
+    """
+    def expected_growth(self, n_steps):
+        raise NotImplementedError("expected growth must be implemented")
+
+    def sample_growth(self, n_paths, n_steps, rng):
+        raise NotImplementedError("sampling must be implemented")
+
+
+class GBMAppreciation(AppreciationModel):
+    # mu and sigma are annual, like the pct column of the specified schedules
+    def __init__(self, mu, sigma):
+        self.mu = mu
+        self.sigma = sigma
+
+    def expected_growth(self, n_steps):
+        return np.full(n_steps, np.exp(self.mu / 12))
+
+    def sample_growth(self, n_paths, n_steps, rng):
+        drift = (self.mu - 0.5 * self.sigma ** 2) / 12
+        shocks = rng.standard_normal((n_paths, n_steps))
+        shocks *= self.sigma / np.sqrt(12)
+        shocks += drift
+        return np.exp(shocks, out=shocks)
+
+
+class BootstrapAppreciation(AppreciationModel):
+    # resamples the monthly pct observations of a historical schedule csv with replacement
+    def __init__(self, csv_loc, block_size=1):
+        pct = get_schedule(csv_loc)['pct']
+        self.pct = pct[~np.isnan(pct)]
+        self.block_size = block_size
+
+    def expected_growth(self, n_steps):
+        return np.full(n_steps, 1 + self.pct.mean() / 12)
+
+    def sample_growth(self, n_paths, n_steps, rng):
+        # moving block bootstrap keeps some of the autocorrelation of the history
+        block_size = max(1, min(self.block_size, len(self.pct)))
+        n_blocks = -(-n_steps // block_size)
+        starts = rng.integers(0, len(self.pct) - block_size + 1, size=(n_paths, n_blocks))
+        idx = (starts[:, :, None] + np.arange(block_size)).reshape(n_paths, -1)[:, :n_steps]
+        return 1 + self.pct[idx] / 12
+
+
+def get_appreciation_model(model, **kwargs):
+    if model == "gbm":
+        return GBMAppreciation(**kwargs)
+    elif model == "bootstrap":
+        return BootstrapAppreciation(**kwargs)
+    raise ValueError(f"unknown appreciation model {model}")
+
+
+class ScenarioEngine:
+    """
+    Evaluates n_paths scenarios of a built FinancesBuilder at once. The deterministic ledger is built
+    once, then every stochastic CashFlowAsset swaps its expected appreciation / income for a
+    (n_paths, n_months) batch and the totals are summarized as percentile bands.
+    """
+    outputs = ["NW", "Cash Balance", "Assets"]
+
+    def __init__(self, builder, n_paths=1000, seed=None, percentiles=(5, 25, 50, 75, 95)):
+        self.builder = builder
+        self.n_paths = n_paths
+        self.seed = seed
+        self.percentiles = list(percentiles)
+
+    def stochastic_assets(self):
+        return [obj for obj in self.builder.objects if getattr(obj, "appreciation_model", None) is not None]
+
+    def simulate(self):
+        """
+        Returns the timestamps and a dict of (n_paths, n_months) arrays for Cash Balance, Assets, Liabilities and NW.
+        """
+        if self.builder.ledger is None:
+            self.builder.generate_master_df()
+        ledger = self.builder.ledger
+        rng = np.random.default_rng(self.seed)
+
+        cash_delta = np.tile(ledger.net_cash, (self.n_paths, 1))
+        assets_delta = np.tile(ledger.assets, (self.n_paths, 1))
+        for obj in self.stochastic_assets():
+            appreciation, income, proceeds = obj.generate_scenario_paths(self.n_paths, rng)
+            start = Calendar.to_ordinal(obj.appreciation.start_timestamp) - ledger.start_ordinal
+            assets_delta[:, start:start + appreciation.shape[1]] += appreciation - np.nan_to_num(obj.appreciation.column)
+            if income is not None:
+                start = Calendar.to_ordinal(obj.income.start_timestamp) - ledger.start_ordinal
+                cash_delta[:, start:start + income.shape[1]] += income - np.asarray(obj.income.column, dtype=float)
+            if proceeds is not None:
+                cash_delta[:, Calendar.to_ordinal(obj.sale_timestamp) - ledger.start_ordinal] += proceeds
+
+        paths = {
+            "Cash Balance": np.cumsum(cash_delta, axis=1, out=cash_delta),
+            "Assets": np.cumsum(assets_delta, axis=1, out=assets_delta),
+            "Liabilities": np.cumsum(ledger.liabilities),
+        }
+        paths["NW"] = paths["Cash Balance"] + paths["Assets"] + paths["Liabilities"]
+        return ledger.months(), paths
+
+    def run(self):
+        import pandas as pd
+        timestamps, paths = self.simulate()
+        bands = {"timestamp": timestamps.copy()}
+        for output in ScenarioEngine.outputs:
+            for q, band in zip(self.percentiles, np.percentile(paths[output], self.percentiles, axis=0)):
+                bands[f"{output} p{q:g}"] = band
+        return pd.DataFrame(bands)
@@ -0,0 +1,184 @@
+import csv
+import glob
+import os
+
+import numpy as np
+
+from FinancesTools.Calendar import Calendar
+
+
+class Schedule:
+    """
+    A parsed schedule csv: int64 timestamps, one per month without gaps, plus one float64 array per value
+    column. Arrays are shared between every object that uses the schedule and must not be mutated.
+    """
+    def __init__(self, path, timestamps, columns):
+        self.path = path
+        self.timestamps = timestamps
+        self.columns = columns
+        Calendar.check(timestamps)
+        self.start_timestamp = int(timestamps.min())
+        self.end_timestamp = int(timestamps.max())
+        # values are placed by position, so every month from start to end must be there once and in order
+        if not (np.diff(Calendar.to_ordinal(timestamps)) == 1).all():
+            raise ValueError(f"{path} must have one row per month from {self.start_timestamp} to {self.end_timestamp} in order")
+
+    def __getitem__(self, name):
+        if name == "timestamp":
+            return self.timestamps
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @staticmethod
+    def parse(path):
+        # numpy only and correctly rounded, so values written with full precision read back exactly
+        with open(path, newline="") as f:
+            header = next(csv.reader(f))
+        try:
+            data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+        except ValueError:
+            # blank cells (nan) or text columns such as notes, which loadtxt does not accept
+            return Schedule(path, *Schedule.parse_cells(path, header))
+        columns = {name: np.ascontiguousarray(data[:, j]) for j, name in enumerate(header) if name != "timestamp"}
+        return Schedule(path, data[:, header.index("timestamp")].astype(np.int64), columns)
+
+    @staticmethod
+    def parse_cells(path, header):
+        """
+        timestamps and value columns read cell by cell, blank cells are nan and columns that are not numeric
+        are left out
+        """
+        with open(path, newline="") as f:
+            rows = [row for row in csv.reader(f)][1:]
+        cells = list(zip(*[row for row in rows if row])) or [()] * len(header)
+        columns = {}
+        for name, column in zip(header, cells):
+            try:
+                columns[name] = np.array([float(x) if x.strip() else np.nan for x in column])
+            except ValueError:
+                if name == "timestamp":
+                    raise
+        return columns.pop("timestamp").astype(np.int64), columns
+
+    def to_records(self):
+        records = np.empty(len(self), dtype=[("timestamp", np.int64)] + [(name, np.float64) for name in self.columns])
+        records["timestamp"] = self.timestamps
+        for name, values in self.columns.items():
+            records[name] = values
+        return records
+
+    @staticmethod
+    def from_records(path, records):
+        return Schedule(path, records["timestamp"], {name: records[name] for name in records.dtype.names if name != "timestamp"})
+
+
+class ScheduleStore:
+    """
+    Schedules keyed by path and (mtime, size), each csv is parsed and checked once. With sidecar=True the
+    parsed arrays are also persisted next to the csv as a memory mappable .npy so later runs skip parsing.
+    """
+    sidecar_dir = ".schedules"
+
+    def __init__(self, sidecar=False):
+        self.sidecar = sidecar
+        self.schedules = {}
+
+    @staticmethod
+    def stamp(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, path):
+        key = os.path.abspath(path)
+        stamp = ScheduleStore.stamp(path)
+        if key in self.schedules and self.schedules[key][0] == stamp:
+            return self.schedules[key][1]
+        schedule = self.load_sidecar(path, stamp) if self.sidecar else None
+        if schedule is None:
+            schedule = Schedule.parse(path)
+            if self.sidecar:
+                self.write_sidecar(path, stamp, schedule)
+        self.schedules[key] = (stamp, schedule)
+        return schedule
+
+    def install(self, schedules):
+        self.schedules.update(schedules)
+
+    def export(self, paths):
+        self.preload(paths)
+        return {os.path.abspath(path): self.schedules[os.path.abspath(path)] for path in paths}
+
+    def preload(self, paths):
+        for path in paths:
+            self.get(path)
+
+    @staticmethod
+    def sidecar_path(path, stamp):
+        directory, name = os.path.split(os.path.abspath(path))
+        return os.path.join(directory, ScheduleStore.sidecar_dir, f"{name}.{stamp[0]}.{stamp[1]}.npy")
+
+    def load_sidecar(self, path, stamp):
+        sidecar = ScheduleStore.sidecar_path(path, stamp)
+        if not os.path.exists(sidecar):
+            return None
+        return Schedule.from_records(path, np.load(sidecar, mmap_mode="r"))
+
+    def write_sidecar(self, path, stamp, schedule):
+        sidecar = ScheduleStore.sidecar_path(path, stamp)
+        os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+        # sidecars of older versions of the csv are stale
+        for old in glob.glob(glob.escape(sidecar.rsplit(".", 3)[0]) + ".*.npy"):
+            os.remove(old)
+        tmp = sidecar + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, schedule.to_records())
+        os.replace(tmp, sidecar)
+
+
+default_store = ScheduleStore()
+
+
+def get_schedule(path):
+    return default_store.get(path)
+
+
+def load_schedules(paths):
+    """
+    Parsed schedules for paths, in a form install_schedules can take in another process
+    """
+    return default_store.export(paths)
+
+
+def install_schedules(schedules):
+    default_store.install(schedules)
+
+
+def worker_schedules(configs):
+    """
+    Parsed schedules of every csv the configs reference, the initargs of init_worker
+    """
+    return (load_schedules(referenced_schedules(configs)),)
+
+
+def init_worker(schedules):
+    # process pool initializer, workers start with the schedules parsed by the parent
+    install_schedules(schedules)
+
+
+def referenced_schedules(config):
+    """
+    Every csv_path / csv_loc referenced anywhere in a config
+    """
+    paths = []
+    if isinstance(config, dict):
+        for key, value in config.items():
+            if key in ("csv_path", "csv_loc") and isinstance(value, str):
+                paths.append(value)
+            else:
+                paths.extend(referenced_schedules(value))
+    elif isinstance(config, list):
+        for value in config:
+            paths.extend(referenced_schedules(value))
+    return list(dict.fromkeys(paths))
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from FinancesTools.FinancesObjects import FinancesBuilder
+from FinancesTools.Pipeline import builder_pipeline
+from FinancesTools.RunCache import RunCache, content_key
+from FinancesTools.Schedules import init_worker, worker_schedules
+
+# per worker process: finance objects of earlier requests, reused with their schedules by later ones
+_objects = RunCache(directory=None)
+
+
+def project(config, outputs=None):
+    """
+    Runs one projection and returns it as json bytes: {"timestamp": [...], output: [...], ...}. Only the
+    requested outputs are computed, every column of the master df when outputs is None.
+    """
+    builder = builder_pipeline(FinancesBuilder(), config, _objects)
+    df = builder.evaluate(outputs) if outputs is not None else builder.generate_master_df()
+    return json.dumps({name: df[name].tolist() for name in df.columns}).encode()
+
+
+def _started():
+    return os.getpid()
+
+
+class ProjectionService:
+    """
+    Long lived projection server. Builds run in a worker pool whose processes keep parsed schedules and built
+    finance objects warm, finished results are kept in an LRU keyed by the content of the request (config,
+    referenced files and outputs) and identical requests that arrive while one is running share its result.
+    Workers come from a forkserver and are all started here, before any socket exists, so none of them holds
+    a client connection or the listening socket open. A pool broken by a dying worker is replaced.
+    """
+    def __init__(self, max_workers=None, max_results=256, preload=()):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.initargs = worker_schedules(list(preload))
+        self.executor = self.start_executor()
+        wait([self.executor.submit(_started) for _ in range(self.max_workers)])
+        self.max_results = max_results
+        self.results = OrderedDict()
+        self.running = {}
+
+    def start_executor(self):
+        context = multiprocessing.get_context("forkserver")
+        return ProcessPoolExecutor(self.max_workers, context, initializer=init_worker, initargs=self.initargs)
+
+    def restart(self, executor):
+        # requests that shared the broken pool only replace it once
+        if self.executor is executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = self.start_executor()
+
+    @staticmethod
+    def request_key(config, outputs):
+        config = {k: v for k, v in config.items() if k not in RunCache.ignored_keys}
+        return content_key(config, outputs)
+
+    async def project(self, config, outputs=None):
+        key = ProjectionService.request_key(config, outputs)
+        if key in self.results:
+            self.results.move_to_end(key)
+            return self.results[key]
+        executor = self.executor
+        try:
+            if key not in self.running:
+                loop = asyncio.get_running_loop()
+                self.running[key] = (executor, loop.run_in_executor(executor, project, config, outputs))
+            executor, future = self.running[key]
+            try:
+                result = await asyncio.shield(future)
+            finally:
+                if key in self.running and self.running[key][1] is future and future.done():
+                    del self.running[key]
+        except BrokenProcessPool:
+            # a worker died, this request fails (or the pool noticed on submit) but the next ones get a fresh pool
+            self.restart(executor)
+            raise
+        self.results[key] = result
+        while len(self.results) > self.max_results:
+            self.results.popitem(last=False)
+        return result
+
+    @staticmethod
+    async def read_request(reader):
+        """
+        (method, target, headers, body) of the next request on the connection, None once the client is done.
+        A request line or Content-Length that does not parse raises ValueError.
+        """
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length < 0:
+            raise ValueError(f"negative Content-Length {length}")
+        return method, target, headers, await reader.readexactly(length)
+
+    @staticmethod
+    async def respond(writer, status, payload):
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+            + payload
+        )
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        # minimal HTTP/1.1 with keep alive: POST /project {"config": {...}, "outputs": [...]}, GET /health
+        try:
+            while True:
+                try:
+                    request = await ProjectionService.read_request(reader)
+                except ValueError as e:
+                    # the rest of the stream can not be framed, answer and drop the connection
+                    await ProjectionService.respond(writer, "400 Bad Request", json.dumps({"error": repr(e)}).encode())
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload = await self.route(method, target, body)
+                await ProjectionService.respond(writer, status, payload)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, target, body):
+        if method == "GET" and target == "/health":
+            return "200 OK", json.dumps({"results": len(self.results), "running": len(self.running)}).encode()
+        if method == "POST" and target == "/project":
+            try:
+                request = json.loads(body)
+                return "200 OK", await self.project(request["config"], request.get("outputs"))
+            except (ValueError, KeyError, TypeError, OSError, AssertionError) as e:
+                return "400 Bad Request", json.dumps({"error": repr(e)}).encode()
+            except Exception as e:
+                return "500 Internal Server Error", json.dumps({"error": repr(e)}).encode()
+        return "404 Not Found", json.dumps({"error": f"no route {method} {target}"}).encode()
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown()
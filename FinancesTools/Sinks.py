@@ -0,0 +1,147 @@
+import json
+import os
+
+import numpy as np
+
+from FinancesTools.Calendar import Calendar
+from FinancesTools.Ledger import Ledger
+
+
+class OutputSink:
+    """
+    Writes a builder's results to one file, streamed chunk by chunk straight from the ledgers. With
+    summary=True only timestamp and the totals are written, and instrument columns are never computed.
+    """
+    extension = None
+
+    def __init__(self, summary=False, chunk_months=120):
+        self.summary = summary
+        self.chunk_months = chunk_months
+
+    def ledgers(self, builder):
+        if self.summary:
+            yield builder.evaluate_ledger(Ledger.totals)
+        else:
+            yield from builder.iter_ledger_chunks(self.chunk_months)
+
+    def frames(self, ledgers):
+        for ledger in ledgers:
+            df = ledger.frame()
+            yield df[["timestamp"] + Ledger.totals] if self.summary else df
+
+    def write(self, builder, path):
+        return self.write_ledgers(self.ledgers(builder), path)
+
+    def write_ledgers(self, ledgers, path):
+        """
+        Write time ordered ledgers (chunks of one horizon, or one full ledger e.g. from the run cache)
+        """
+        raise NotImplementedError("write behavior must be implemented")
+
+
+class CsvSink(OutputSink):
+    extension = ".csv"
+
+    def write_ledgers(self, ledgers, path):
+        with open(path, "w", newline="") as f:
+            offset = 0
+            for i, chunk in enumerate(self.frames(ledgers)):
+                chunk.index = range(offset, offset + len(chunk))
+                chunk.to_csv(f, header=(i == 0))
+                offset += len(chunk)
+        return path
+
+
+class ParquetSink(OutputSink):
+    extension = ".parquet"
+
+    @staticmethod
+    def open_writer(path, schema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(path, schema)
+
+    def tables(self, ledgers):
+        # arrow arrays straight from the ledger matrix columns, no DataFrame in between
+        import pyarrow as pa
+        for ledger in ledgers:
+            names = ledger.output_names()
+            ints = ledger.int_outputs()
+            keep = range(len(names) - len(Ledger.totals), len(names)) if self.summary else range(len(names))
+            arrays = [pa.array(ledger.months())]
+            for k in keep:
+                column = ledger.matrix[:, k].astype(np.int64) if k in ints else np.ascontiguousarray(ledger.matrix[:, k])
+                arrays.append(pa.array(column))
+            yield pa.Table.from_arrays(arrays, names=["timestamp"] + [names[k] for k in keep])
+
+    def write_ledgers(self, ledgers, path):
+        writer = None
+        for table in self.tables(ledgers):
+            if writer is None:
+                writer = self.open_writer(path, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+        return path
+
+
+class ArrowSink(ParquetSink):
+    """
+    Arrow IPC file, other tools can memory map it with pyarrow.memory_map + pyarrow.ipc.open_file
+    """
+    extension = ".arrow"
+
+    @staticmethod
+    def open_writer(path, schema):
+        import pyarrow as pa
+        return pa.ipc.new_file(path, schema)
+
+
+class NpySink(OutputSink):
+    """
+    The float64 value matrix (months x columns) as a .npy that np.load(path, mmap_mode="r") maps without
+    parsing, plus <path>.timestamps.npy and <path>.columns.json naming its rows and columns. Chunks are
+    copied from the ledger straight into the memory mapped file.
+    """
+    extension = ".npy"
+
+    @staticmethod
+    def sidecar_paths(path):
+        stem = os.path.splitext(path)[0]
+        return stem + ".timestamps.npy", stem + ".columns.json"
+
+    def write_ledgers(self, ledgers, path):
+        timestamps_path, columns_path = NpySink.sidecar_paths(path)
+        out = None
+        row = 0
+        for ledger in ledgers:
+            block = ledger.matrix[:, -len(Ledger.totals):] if self.summary else ledger.matrix
+            if out is None:
+                n_months = ledger.horizon_months
+                np.save(timestamps_path, Calendar.month_range(*ledger.horizon))
+                names = Ledger.totals if self.summary else ledger.output_names()
+                with open(columns_path, "w") as f:
+                    json.dump(names, f)
+                out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(n_months, block.shape[1]))
+            out[row:row + len(block)] = block
+            row += len(block)
+        if out is not None:
+            out.flush()
+            del out
+        return path
+
+
+def open_npy(path):
+    """
+    Timestamps, column names and the read only memory mapped value matrix of an NpySink output
+    """
+    timestamps_path, columns_path = NpySink.sidecar_paths(path)
+    with open(columns_path) as f:
+        columns = json.load(f)
+    return np.load(timestamps_path), columns, np.load(path, mmap_mode="r")
+
+
+sinks = {"csv": CsvSink, "parquet": ParquetSink, "arrow": ArrowSink, "npy": NpySink}
+
+
+def get_sink(format="csv", **kwargs):
+    return sinks[format](**kwargs)
@@ -0,0 +1,102 @@
+import copy
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from FinancesTools.FinancesObjects import FinancesBuilder
+from FinancesTools.Pipeline import builder_pipeline
+from FinancesTools.Schedules import init_worker, worker_schedules
+
+
+def set_path(config, path, value):
+    """
+    Set a value in a config by dotted path. List entries are picked by index or by their "name",
+    e.g. "loans.0.rate" or "incomes.Living Expenses.income_amount"
+    """
+    keys = path.split(".")
+    node = config
+    for key in keys[:-1]:
+        node = _child(node, key)
+    if isinstance(node, list):
+        node[_list_index(node, keys[-1])] = value
+    else:
+        node[keys[-1]] = value
+
+
+def get_path(config, path):
+    node = config
+    for key in path.split("."):
+        node = _child(node, key)
+    return node
+
+
+def _child(node, key):
+    if isinstance(node, list):
+        return node[_list_index(node, key)]
+    return node[key]
+
+
+def _list_index(node, key):
+    if key.lstrip("-").isdigit():
+        return int(key)
+    for i, entry in enumerate(node):
+        if isinstance(entry, dict) and entry.get("name") == key:
+            return i
+    raise KeyError(f"no entry named {key}")
+
+
+def axis_values(axis):
+    # either an explicit list of values or {"start", "stop", "num"} for an evenly spaced range
+    if isinstance(axis, dict):
+        return np.linspace(axis["start"], axis["stop"], axis["num"]).tolist()
+    return list(axis)
+
+
+def expand_grid(base_config, axes):
+    """
+    Cartesian product of the parameter axes, as a list of (point, config) pairs
+    """
+    names = list(axes)
+    points = []
+    for values in itertools.product(*[axis_values(axes[name]) for name in names]):
+        point = dict(zip(names, values))
+        config = copy.deepcopy(base_config)
+        for name, value in point.items():
+            set_path(config, name, value)
+        points.append((point, config))
+    return points
+
+
+def evaluate_config(config, outputs):
+    # only what the outputs need, straight from the ledger
+    ledger = builder_pipeline(FinancesBuilder(), config).evaluate_ledger(outputs)
+    return ledger.months(), {output: ledger.column(output).copy() for output in outputs}
+
+
+def _evaluate(args):
+    return evaluate_config(*args)
+
+
+def run_sweep(base_config, axes, max_workers=None, outputs=("Cash Balance", "Assets", "Liabilities", "NW")):
+    """
+    Runs builder_pipeline + generate_master_df for every point of the grid in a process pool and returns one
+    long format table: a row per (point, timestamp) keyed by the parameter values. Schedule csvs are parsed once
+    here and shipped to each worker when it starts.
+    """
+    import pandas as pd
+    points = expand_grid(base_config, axes)
+    outputs = list(outputs)
+
+    initargs = worker_schedules([config for _, config in points])
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=initargs) as pool:
+        results = list(pool.map(_evaluate, [(config, outputs) for _, config in points]))
+
+    frames = []
+    for (point, _), (timestamps, values) in zip(points, results):
+        frame = pd.DataFrame({name: [value] * len(timestamps) for name, value in point.items()})
+        frame['timestamp'] = timestamps
+        for output in outputs:
+            frame[output] = values[output]
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,117 @@
+import numpy as np
+
+from FinancesTools.Calendar import Calendar
+from FinancesTools.FinancesObjects import FinanceObject, SpecifiedColumn
+from FinancesTools.Income import SimpleIncomeStream, SpecifiedIncomeStream
+
+
+class TaxWithholding(SpecifiedColumn):
+    __slots__ = ()
+
+    def __init__(self, name, start_timestamp, end_timestamp, column):
+        super(TaxWithholding, self).__init__(name, start_timestamp, end_timestamp, column)
+
+    # withholding comes out of cash
+    def get_net_cash_delta(self):
+        return self.get_dense_delta()
+
+
+class TaxStage:
+    """
+    Builder stage that withholds progressive income tax from the income stream columns. brackets are
+    [[threshold, rate], ...] on annual income (a 0 rate first bracket works as a standard deduction), thresholds
+    grow by indexing per year after base_year (the first taxed year by default). Tax is computed on year to date
+    income, reset every calendar year, and each month withholds the increase in year to date tax. With
+    joint=True the streams are taxed together as one income, otherwise each stream on its own.
+    incomes limits the taxed streams by column name and exclude leaves streams out (e.g. an opening cash balance
+    entered as a one month income), by default every income stream column is taxed. Only positive months are
+    income, streams without any (expenses entered as negative incomes) get no tax column.
+    """
+    def __init__(self, brackets, indexing=0.0, base_year=None, joint=True, incomes=None, exclude=(),
+                 name="income tax"):
+        brackets = sorted(brackets)
+        self.thresholds = np.array([threshold for threshold, _ in brackets], dtype=float)
+        self.rates = np.array([rate for _, rate in brackets], dtype=float)
+        self.indexing = indexing
+        self.base_year = base_year
+        self.joint = joint
+        self.incomes = incomes
+        self.exclude = set(exclude)
+        self.name = name
+
+    def taxed_columns(self, objects):
+        return [
+            col for obj in objects if isinstance(obj, (SimpleIncomeStream, SpecifiedIncomeStream))
+            for col in obj
+            if (self.incomes is None or col.name in self.incomes) and col.name not in self.exclude
+            and TaxStage.has_income(col)
+        ]
+
+    @staticmethod
+    def has_income(col):
+        values = np.nan_to_num(np.asarray(col.get_compact_values(), dtype=float))
+        return bool(np.any(values > 0))
+
+    @staticmethod
+    def income_matrix(columns):
+        """
+        months x streams matrix of the columns' positive values over their combined span, and its first ordinal
+        """
+        first = min(col.start_ordinal for col in columns)
+        last = max(col.end_ordinal for col in columns)
+        matrix = np.zeros((last - first + 1, len(columns)))
+        for j, col in enumerate(columns):
+            offset = col.start_ordinal - first
+            values = np.nan_to_num(np.asarray(col.get_compact_values(), dtype=float))
+            matrix[offset:offset + col.n_months, j] = np.maximum(values, 0)
+        return matrix, first
+
+    def year_to_date_tax(self, ytd, years):
+        """
+        Tax owed on year to date income ytd (months x streams), bracket thresholds indexed by each month's year
+        """
+        base_year = self.base_year if self.base_year is not None else years[0]
+        thresholds = self.thresholds * (1 + self.indexing) ** (years - base_year)[:, None]
+        widths = np.diff(thresholds, axis=1, append=np.inf)
+        taxed = np.clip(ytd[:, :, None] - thresholds[:, None, :], 0, widths[:, None, :])
+        return taxed @ self.rates
+
+    def withholding(self, matrix, first):
+        """
+        Monthly withholding (months x streams, positive) for an income matrix starting at ordinal first
+        """
+        ordinals = first + np.arange(len(matrix))
+        years = ordinals // 12
+        new_year = np.ones(len(matrix), dtype=bool)
+        new_year[1:] = years[1:] != years[:-1]
+        group = np.cumsum(new_year) - 1
+
+        # cumulative sums grouped by calendar year: the running total minus its value before the year started
+        running = np.cumsum(matrix, axis=0)
+        before = np.vstack([np.zeros((1, matrix.shape[1])), running])[np.flatnonzero(new_year)]
+        ytd = running - before[group]
+
+        tax = self.year_to_date_tax(ytd, years)
+        withheld = np.diff(tax, axis=0, prepend=0.0)
+        withheld[new_year] = tax[new_year]
+        return withheld
+
+    def apply(self, objects):
+        """
+        Finance objects holding the tax withholding columns for the income streams among objects
+        """
+        columns = self.taxed_columns(objects)
+        if not columns:
+            return []
+        matrix, first = TaxStage.income_matrix(columns)
+        if self.joint:
+            matrix = matrix.sum(axis=1, keepdims=True)
+        withheld = self.withholding(matrix, first)
+
+        start, end = Calendar.from_ordinal(first), Calendar.from_ordinal(first + len(matrix) - 1)
+        names = [self.name] if self.joint else [f"{col.name} tax" for col in columns]
+        taxes = FinanceObject()
+        for j, name in enumerate(names):
+            # 0.0 - keeps the months without tax at 0.0 instead of -0.0
+            taxes.add_column_object(TaxWithholding(name, start, end, 0.0 - withheld[:, j]))
+        return [taxes]
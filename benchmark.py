@@ -0,0 +1,181 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from FinancesTools.Calendar import Calendar
+from FinancesTools.FinancesObjects import FinancesBuilder
+from FinancesTools.Pipeline import builder_pipeline
+from FinancesTools.Assets import CashFlowAsset
+from FinancesTools.Loans import Loan
+
+APPRECIATION_TYPES = ["constant", "specified"]
+INCOME_TYPES = ["constant", "proportional"]
+
+
+def write_schedule(path, start, end, column, values):
+    pd.DataFrame({"timestamp": Calendar.month_range(start, end), column: values}).to_csv(path, index=False)
+
+
+def synthetic_config(schedule_dir, n_loans=10, n_assets=2, n_incomes=10, months=360, start=202301, seed=0):
+    """
+    Config with n_loans loans, n_assets CashFlowAssets of every appreciation x income type and n_incomes
+    SimpleIncomeStream plus n_incomes SpecifiedIncomeStream entries, all over months months from start.
+    """
+    rng = np.random.default_rng(seed)
+    end = Calendar.add_months(start, months - 1)
+    config = {"loans": [], "assets": [], "incomes": []}
+
+    for i in range(n_loans):
+        config["loans"].append({
+            "name": f"loan {i}",
+            "start_timestamp": start,
+            "end_timestamp": Calendar.add_months(start, int(rng.integers(12, months - 1))),
+            "loan_amount": float(rng.uniform(1e4, 1e6)),
+            "rate": float(rng.uniform(0.02, 0.08)),
+        })
+
+    # assets start on the first month and are appreciated until one month past the end, like main's config
+    market_csv = os.path.join(schedule_dir, "market.csv")
+    write_schedule(market_csv, start, end, "pct", rng.normal(0.04, 0.02, months))
+    for appreciation_type in APPRECIATION_TYPES:
+        for income_type in INCOME_TYPES:
+            for i in range(n_assets):
+                config["assets"].append({
+                    "name": f"{appreciation_type} {income_type} asset {i}",
+                    "start_timestamp": start,
+                    "end_timestamp": Calendar.add_months(end, -1),
+                    "asset_cost": float(rng.uniform(1e5, 1e6)),
+                    "appreciation_type": appreciation_type,
+                    "appreciation_args": {"appreciation_amount": 500.0} if appreciation_type == "constant" else {"csv_loc": market_csv},
+                    "income_type": income_type,
+                    "income_args": {"income_amount": 2000.0} if income_type == "constant" else {"proportion": 0.004},
+                })
+
+    for i in range(n_incomes):
+        config["incomes"].append({
+            "name": f"simple income {i}",
+            "start_timestamp": start,
+            "end_timestamp": Calendar.add_months(start, int(rng.integers(0, months))),
+            "income_amount": float(rng.uniform(-5000, 10000)),
+        })
+        income_csv = os.path.join(schedule_dir, f"income_{i}.csv")
+        write_schedule(income_csv, start, end, "income", rng.normal(8000, 500, months).round(2))
+        config["incomes"].append({"type": "manual_schedule", "name": f"specified income {i}", "csv_path": income_csv})
+    return config
+
+
+def measure(func, repeat, setup=None):
+    """
+    Best / median wall time over repeat runs and the peak traced allocation of one run, setup runs untimed
+    before each of them
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        t = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - t)
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"best_s": min(times), "median_s": statistics.median(times), "peak_bytes": peak, "repeat": repeat}
+
+
+def run_benchmarks(config, repeat=5):
+    results = {}
+    builder, results["builder_pipeline"] = measure(lambda: builder_pipeline(FinancesBuilder(), config), repeat)
+    # columns (and loans their amortization) memoize their values, without invalidating every repeat after the
+    # first would only time the merge
+    columns = [col for obj in builder.objects for col in obj]
+    loans = [obj for obj in builder.objects if isinstance(obj, Loan)]
+
+    def invalidate():
+        for loan in loans:
+            loan.schedule = None
+        for col in columns:
+            col.invalidate()
+
+    _, results["generate_master_df"] = measure(builder.generate_master_df, repeat, invalidate)
+
+    _, results["loan_interest_and_principal"] = measure(lambda: [loan.get_interest_and_principal() for loan in loans], repeat)
+
+    assets = [obj for obj in builder.objects if isinstance(obj, CashFlowAsset)]
+    for appreciation_type in APPRECIATION_TYPES:
+        for income_type in INCOME_TYPES:
+            entries = [cfg for cfg in config["assets"] if cfg["appreciation_type"] == appreciation_type and cfg["income_type"] == income_type]
+            key = f"cash_flow_asset_{appreciation_type}_{income_type}"
+            _, results[key] = measure(lambda: [CashFlowAsset(**cfg) for cfg in entries], repeat)
+            results[key]["n_objects"] = len(entries)
+
+    for kind, schedule_types in [("appreciation", APPRECIATION_TYPES), ("income", INCOME_TYPES)]:
+        for schedule_type in schedule_types:
+            generator = f"generate_{schedule_type}_{kind}_schedule"
+            calls = [(getattr(asset, generator), cfg[f"{kind}_args"]) for asset, cfg in zip(assets, config["assets"]) if cfg[f"{kind}_type"] == schedule_type]
+            # the schedules are lazy, materialize them so the timing covers computing the values
+            _, results[generator] = measure(lambda: [call(**kwargs).get_column_values() for call, kwargs in calls], repeat)
+            results[generator]["n_objects"] = len(calls)
+
+    results["sizes"] = {
+        "objects": len(builder.objects),
+        "columns": sum(len(list(obj)) for obj in builder.objects),
+        "months": Calendar.n_months(builder.min_timestamp, builder.max_timestamp),
+    }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the model stages on a synthetic config, results as json")
+    parser.add_argument("--loans", type=int, default=100)
+    parser.add_argument("--assets", type=int, default=25, help="CashFlowAssets per appreciation x income type")
+    parser.add_argument("--incomes", type=int, default=100, help="SimpleIncomeStreams and SpecifiedIncomeStreams each")
+    parser.add_argument("--months", type=int, default=360)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="json file to write, defaults to stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as schedule_dir:
+        config = synthetic_config(schedule_dir, args.loans, args.assets, args.incomes, args.months, seed=args.seed)
+        results = run_benchmarks(config, args.repeat)
+
+    report = {
+        "timestamp": datetime.today().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "params": vars(args),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
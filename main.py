@@ -1,63 +1,22 @@
+import argparse
 import json
 # from FinanceTools.FixedIncomes import FixedIncome, OneTimePayment, TaxedSalary, Salary, MonthlyExpense, OneTimeGift
 import os
-import matplotlib.pyplot as plt
-import matplotlib
+import tempfile
 
 from FinancesTools.FinancesObjects import FinancesBuilder
-from FinancesTools.Income import SimpleIncomeStream, SpecifiedIncomeStream
-from FinancesTools.Loans import Loan
-from FinancesTools.Assets import CashFlowAsset
+from FinancesTools.Pipeline import builder_pipeline
+from FinancesTools import Schedules
+from FinancesTools.Ledger import Ledger
+from FinancesTools.Sinks import get_sink
 from datetime import datetime
 
 
-def builder_pipeline(builder, config):
-
-    # if "fixed_incomes" in config:
-    #     for fi in config['fixed_incomes']:
-    #         builder.add_object(FixedIncome(**fi))
-    #
-    # if "salaries" in config:
-    #     for s in config['salaries']:
-    #         builder.add_object(Salary(**s))
-    #
-    # if "taxed_salaries" in config:
-    #     for s in config['taxed_salaries']:
-    #         builder.add_object(TaxedSalary(**s))
-    #
-    # if "one_time_payments" in config:
-    #     for otp in config['one_time_payments']:
-    #         builder.add_object(OneTimePayment(**otp))
-    #
-    # if "one_time_gifts" in config:
-    #     for cfg in config['one_time_gifts']:
-    #         builder.add_object(OneTimeGift(**cfg))
-    #
-    # if "monthly_expenses" in config:
-    #     for me in config['monthly_expenses']:
-    #         builder.add_object(MonthlyExpense(**me))
-    #
-
-    if "loans" in config:
-        for ln in config['loans']:
-            builder.add_finance_object(Loan(**ln))
-
-    if "assets" in config:
-        for cfg in config['assets']:
-            builder.add_finance_object(CashFlowAsset(**cfg))
-
-    if "incomes" in config:
-        for cfg in config['incomes']:
-            if "type" in cfg:
-                if cfg['type'] == "manual_schedule":
-                    builder.add_finance_object(SpecifiedIncomeStream(**cfg))
-            else:
-                builder.add_finance_object(SimpleIncomeStream(**cfg))
-
-    return builder
-
-
 def plots(df, out_dir, xrange=None, yrange=None, figsize=None):
+    # matplotlib is only imported when a plot is drawn, headless runs never pay for it
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots(figsize=figsize)
     ax.plot(df.index, df['NW'], label="Net Worth", marker="o")
     ax.plot(df.index, df['Cash Balance'], label="Cash Balance", marker="o")
@@ -77,12 +36,15 @@ def plots(df, out_dir, xrange=None, yrange=None, figsize=None):
 
 
 if __name__ == '__main__':
-    config_loc = "config.json"
+    parser = argparse.ArgumentParser(description="Run the model on a config, results go to executions/<timestamp>_<suffix>")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--headless", action="store_true", help="no printing or plotting, for batch jobs")
+    args = parser.parse_args()
+    config_loc = args.config
     time = datetime.today().strftime('%Y%m%d%H%M%S')
     out_path = f"{time}.csv"
-    executions_path = "executions"
-    executions_path = os.path.join(executions_path, time)
-    os.mkdir(executions_path)
+    # jobs started in the same second each get their own directory
+    executions_path = tempfile.mkdtemp(prefix=f"{time}_", dir="executions")
     out_path = os.path.join(executions_path, out_path)
 
     with open(config_loc, "r") as f:
@@ -91,13 +53,73 @@ if __name__ == '__main__':
     with open(os.path.join(executions_path, "config.json"), "w") as f:
         json.dump(config, f, indent=4)
 
-    builder = FinancesBuilder()
-
-    builder = builder_pipeline(builder, config)
-
-    df = builder.generate_master_df()
-    print("printing")
-    print(df)
-    plots(df, executions_path, **config['plotting'])
+    if config.get("schedule_sidecars"):
+        Schedules.default_store.sidecar = True
+
+    # "headless": true, or --headless, skips printing and plotting, with an npy output pandas is never imported
+    headless = args.headless or config.get("headless", False)
+
+    # "profile": {"track_memory": true, "verbose": true} records per stage timings into profile.json
+    profile = config.get("profile")
+    profiler = None
+    if profile:
+        from FinancesTools.Instrumentation import Profiler, print_hook
+        profile = profile if isinstance(profile, dict) else {}
+        profiler = Profiler(track_memory=profile.get("track_memory", False), hooks=[print_hook] if profile.get("verbose") else [])
+
+    # "cache": {"directory": ".run_cache", "max_entries": 32} reuses the ledger of an identical earlier run, and
+    # the objects of unchanged entries when only part of the config changed
+    cache = None
+    ledger = None
+    if "cache" in config:
+        from FinancesTools.RunCache import RunCache
+        cache = RunCache(**config['cache'])
+        key = cache.key(config)
+        ledger = cache.get(key)
+
+    # "workers": 8 fills the ledger in a pool of 8 processes, same results
+    builder = FinancesBuilder(profiler, config.get("workers"))
+    if ledger is None or "scenarios" in config:
+        builder = builder_pipeline(builder, config, cache)
+    if ledger is not None:
+        print(f"reusing cached run {key}")
+        builder.ledger = ledger
+        builder.bind_ledger()
+
+    # "output": {"format": "parquet" | "arrow" | "npy" | "csv", "summary": true} streams the results through a
+    # sink instead of writing the full master df as csv, the plot then only needs the totals
+    output = config.get("output")
+    # the plot, the scenarios and the cache read the full ledger: it is built once and the sink writes that same
+    # ledger, only a headless output run without them streams the sink chunk by chunk
+    if builder.ledger is None and (not output or not headless or "scenarios" in config or cache is not None):
+        builder.build_ledger()
+        if cache is not None:
+            cache.put(key, builder.ledger)
+            cache.save_objects()
+
+    if output:
+        sink = get_sink(**output)
+        out_path = os.path.join(executions_path, f"{time}{sink.extension}")
+        if builder.ledger is not None:
+            sink.write_ledgers([builder.ledger], out_path)
+        else:
+            sink.write(builder, out_path)
+    else:
+        master_df = builder.ledger.frame()
+
+    if not headless:
+        df = builder.ledger.frame()[["timestamp"] + Ledger.totals] if output else master_df
+        print("printing")
+        print(df)
+        plots(df, executions_path, **config.get('plotting', {}))
+    if "scenarios" in config:
+        from FinancesTools.Scenarios import ScenarioEngine
+        bands = ScenarioEngine(builder, **config['scenarios']).run()
+        bands.to_csv(os.path.join(executions_path, "scenario_bands.csv"))
     print(executions_path)
-    df.to_csv(out_path)
+    if not output:
+        master_df.to_csv(out_path)
+    if profiler is not None:
+        profiler.close()
+        with open(os.path.join(executions_path, "profile.json"), "w") as f:
+            json.dump(profiler.report(), f, indent=4)
@@ -0,0 +1,31 @@
+import argparse
+import asyncio
+import json
+
+from FinancesTools.Service import ProjectionService
+
+
+if __name__ == '__main__':
+    # POST /project {"config": {...}, "outputs": ["NW", "Cash Balance"]} answers
+    # {"timestamp": [...], "NW": [...], "Cash Balance": [...]}, omit outputs for every master df column
+    parser = argparse.ArgumentParser(description="Serve projections over http from warm worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-results", type=int, default=256)
+    parser.add_argument("--preload", nargs="*", default=[], help="configs whose schedules are parsed before serving")
+    args = parser.parse_args()
+
+    preload = []
+    for path in args.preload:
+        with open(path, "r") as f:
+            preload.append(json.load(f))
+
+    service = ProjectionService(args.workers, args.max_results, preload)
+    print(f"serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
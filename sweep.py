@@ -0,0 +1,36 @@
+import argparse
+import json
+import os
+from datetime import datetime
+
+from FinancesTools.Sweep import run_sweep
+
+
+if __name__ == '__main__':
+    # axes file maps config paths to values, e.g.
+    # {"loans.investment loan.rate": {"start": 0.045, "stop": 0.07, "num": 6},
+    #  "incomes.Living Expenses.income_amount": [-6000, -7000, -8000, -9000]}
+    parser = argparse.ArgumentParser(description="Run the model over a grid of config parameters")
+    parser.add_argument("axes", help="json file of parameter axes")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    time = datetime.today().strftime('%Y%m%d%H%M%S')
+    executions_path = os.path.join("executions", f"sweep_{time}")
+    os.makedirs(executions_path)
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    with open(args.axes, "r") as f:
+        axes = json.load(f)
+
+    with open(os.path.join(executions_path, "config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+    with open(os.path.join(executions_path, "axes.json"), "w") as f:
+        json.dump(axes, f, indent=4)
+
+    df = run_sweep(config, axes, max_workers=args.workers)
+    print(df)
+    df.to_csv(os.path.join(executions_path, f"sweep_{time}.csv"))
+    print(executions_path)